@@ -1,42 +1,134 @@
-from flask import Flask
+import os
+import click
+from flask import Flask, current_app
 from flask_login import LoginManager
-from models import db, User
-from views import views_bp
-from seed import create_default_shop, seed_shop_items, create_default_user
-
-# Initialize Flask App
-app = Flask(__name__)
-
-# Configuration
-app.config['SECRET_KEY'] = 'your_secret_key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///Web_app.db'    
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/artisans'
-
-# Initialize Extensions
-db.init_app(app)
+from config import get_config
+from models import db, tune_sqlite
+from replicas import replica_router
+from passwords import password_hasher
+from principal import load_principal, user_cache
+from categories import category_cache
+from jobs import image_worker
+from fragments import fragment_cache
+from images import image_srcset
+from assets import asset_fingerprints
+from media import media_server
+from conditional import add_validators
+from instrumentation import request_metrics
+from commands import register_commands
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'views.login' 
+login_manager.login_view = 'views.login'
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Cached slim principal: no DB round-trip on most authenticated requests
+    return load_principal(user_id)
+
+
+def create_app(config=None):
+    """
+    Build and configure an app. Nothing here touches the database, starts a
+    thread or seeds data, so importing this module and calling create_app()
+    is cheap and safe in every prefork worker. Schema and seed data are
+    managed with `flask db upgrade` / `flask init-db` and `flask seed ...`.
+
+    `config` is a config class, a config name ('development', 'production',
+    'testing') or None for APP_CONFIG (see config.py).
+    """
+    app = Flask(__name__)
+    app.config.from_object(config if isinstance(config, type) else get_config(config))
+
+    # Initialize Extensions
+    db.init_app(app)
+    tune_sqlite(app)
+    replica_router.init_app(app)   # GET requests read from SQLALCHEMY_REPLICAS, if any
+    password_hasher.init_app(app)
+    image_worker.init_app(app)   # the dispatcher thread starts on the first upload
+    fragment_cache.init_app(app)
+    login_manager.init_app(app)
+    _init_migrations(app)
+    _init_catalog_snapshot(app)
+
+    # Per-request timing (Server-Timing header, slow-request log, /metrics);
+    # registered before the blueprint so its hooks wrap every view
+    request_metrics.init_app(app)
+
+    # Register Blueprints
+    from views import views_bp
+    app.register_blueprint(views_bp)
+
+    # Template helpers
+    app.jinja_env.globals['image_srcset'] = image_srcset
+
+    # HTTP caching: ETag/Last-Modified on pages, fingerprinted long-lived static URLs
+    app.after_request(add_validators)
+    asset_fingerprints.init_app(app)
+
+    # Static/media delivery: MEDIA_SERVE_MODE = flask | sendfile | x-accel | x-sendfile
+    media_server.init_app(app)
+
+    # Cache and queue figures alongside the request histograms on /metrics
+    request_metrics.add_gauges(app, _cache_and_queue_gauges)
+
+    register_commands(app)
+    return app
+
+
+def _init_migrations(app):
+    """
+    Flask-Migrate (and Alembic behind it) is only needed by the `flask db`
+    commands, and importing it is a large share of a cold start. Attach it
+    when running under the flask CLI; web workers never load it.
+    """
+    if click.get_current_context(silent=True) is None:
+        return
+    from flask_migrate import Migrate
+    # Batch mode lets SQLite alter columns by copying the table
+    Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'), render_as_batch=True)
+
+
+def _init_catalog_snapshot(app):
+    """
+    The columnar catalogue snapshot (and NumPy behind it) is opt-in; the
+    module is only imported when CATALOG_SNAPSHOT is set. It loads on the
+    first price-sorted catalogue request.
+    """
+    if not app.config.get('CATALOG_SNAPSHOT'):
+        return
+    from snapshot import catalog_snapshot
+    catalog_snapshot.init_app(app)
+
+
+def _cache_and_queue_gauges():
+    users, fragments, jobs = user_cache.stats(), fragment_cache.stats(), image_worker.stats()
+    gauges = {
+        'user_cache_size': users['size'],
+        'user_cache_hits': users['hits'],
+        'user_cache_misses': users['misses'],
+        'category_cache_size': category_cache.stats()['size'],
+        'fragment_cache_hits': fragments['hits'],
+        'fragment_cache_misses': fragments['misses'],
+        'image_jobs_oldest_queued_age_seconds': jobs['oldest_queued_age'],
+        'image_jobs_latency_p95_seconds': jobs['latency_p95'],
+    }
+    if 'catalog_snapshot' in current_app.extensions:
+        snapshot = current_app.extensions['catalog_snapshot'].stats()
+        gauges.update({
+            'catalog_snapshot_rows': snapshot['rows'],
+            'catalog_snapshot_bytes': snapshot['bytes'],
+            'catalog_snapshot_delta_rows': snapshot['delta'],
+            'catalog_snapshot_syncs': snapshot['syncs'],
+        })
+    for status, count in jobs['depth'].items():
+        gauges[f'image_jobs_{status}'] = count
+    return gauges
 
-# Register Blueprints
-app.register_blueprint(views_bp)
 
 # --- MAIN EXECUTION ---
+# Development server only; production runs e.g. `gunicorn 'app:create_app()'`.
+# Prepare the database first with `flask init-db` and `flask seed defaults`.
 if __name__ == '__main__':
-    with app.app_context():
-        db.drop_all()
-        # Creates tables based on models.py
-        db.create_all() 
-        
-        # Seed default data
-        create_default_user()
-        create_default_shop()
-        seed_shop_items()
-
-    app.run(debug=True) 
\ No newline at end of file
+    app = create_app()
+    app.run(debug=app.config.get('DEBUG', False))
@@ -0,0 +1,69 @@
+import os
+import hashlib
+import threading
+from flask import request, current_app
+from storage import is_content_addressed, IMMUTABLE_CACHE_CONTROL
+
+
+class AssetFingerprints:
+    """
+    Appends ?v=<content hash> to url_for('static', ...) URLs and serves
+    requests carrying the current hash with a year-long immutable
+    Cache-Control. A changed file gets a new URL, so long caching is safe.
+    Content-addressed uploads are immutable by name and need no suffix.
+    """
+
+    def __init__(self, app=None):
+        self._hashes = {}   # filename -> (mtime, hash)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('STATIC_FINGERPRINTS', True)
+        app.extensions['asset_fingerprints'] = self
+        app.url_defaults(self._add_version)
+        app.after_request(self._cache_headers)
+
+    def fingerprint(self, filename):
+        path = os.path.join(current_app.static_folder, filename)
+        cached = self._hashes.get(filename)
+        # Files only change under a dev server; production skips the stat call.
+        if cached is not None and not current_app.debug:
+            return cached[1]
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(64 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()[:12]
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
+
+    def _add_version(self, endpoint, values):
+        if endpoint != 'static' or 'v' in values or not current_app.config['STATIC_FINGERPRINTS']:
+            return
+        filename = values.get('filename')
+        if filename and not is_content_addressed(filename):
+            digest = self.fingerprint(filename)
+            if digest:
+                values['v'] = digest
+
+    def _cache_headers(self, response):
+        if request.endpoint != 'static' or response.status_code not in (200, 206, 304):
+            return response
+        filename = request.view_args.get('filename')
+        if is_content_addressed(filename) or \
+                request.args.get('v') and request.args.get('v') == self.fingerprint(filename):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+asset_fingerprints = AssetFingerprints()
@@ -0,0 +1,509 @@
+"""
+Benchmarks for the core routes. Results are printed (and optionally written)
+as JSON so runs can be compared over time.
+
+    python bench.py seed --shops 50 --items 500 --categories 20
+    python bench.py routes --requests 200 --output bench_routes.json
+    python bench.py load --url http://127.0.0.1:5000 --users 20 --duration 30
+    python bench.py flash-sale --buyers 200 --stock 50
+    python bench.py startup --runs 10 --budget-ms 800
+    python bench.py snapshot --items 1000000 --queries 500
+
+`seed`, `routes` and `flash-sale` use the database in BENCH_DATABASE_URL (default
+sqlite:///bench.db, i.e. instance/bench.db) with the testing config. `load`
+drives an already running server over HTTP with concurrent simulated users.
+`flash-sale` has many buyers check out one scarce item at the same moment and
+verifies nothing was oversold. `startup` times cold starts of a worker (fresh
+interpreter: import the app module, then create_app()) and fails if the p95
+exceeds the budget. `snapshot` compares the in-process columnar catalogue
+snapshot (snapshot.py) with the indexed SQL query for "category C, price in
+[X, Y), cheapest first, top N": ids only and hydrated, plus load and
+incremental-refresh cost. Seed the rows first, e.g. 1M items with
+`seed --shops 1000 --items 1000 --categories 50`.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import platform
+import threading
+import http.cookiejar
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+os.environ.setdefault('APP_CONFIG', 'testing')
+os.environ.setdefault('TEST_DATABASE_URL', os.environ.get('BENCH_DATABASE_URL', 'sqlite:///bench.db'))
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean/max of a list of numbers (milliseconds)."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 3)
+
+    return {'count': len(ordered), 'p50': pick(50), 'p95': pick(95), 'p99': pick(99),
+            'mean': round(sum(ordered) / len(ordered), 3), 'max': round(ordered[-1], 3)}
+
+
+def emit(result, output):
+    result['meta'] = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+
+
+# --- SEED ---
+def cmd_seed(args):
+    from app import create_app
+    app = create_app()
+    from models import db
+    from seed import seed_synthetic
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed_synthetic(args.shops, args.items, args.categories)
+        emit({'benchmark': 'seed', 'shops': args.shops, 'items_per_shop': args.items,
+              'categories': args.categories,
+              'seconds': round(time.perf_counter() - started, 3)}, args.output)
+
+
+# --- ROUTES (in-process, Flask test client) ---
+class StatementCounter:
+    """Counts SQL statements on the engine, across threads and app contexts."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._inc)
+
+    def _inc(self, *args):
+        self.count += 1
+
+
+def cmd_routes(args):
+    from app import create_app
+    app = create_app()
+    from models import db, User
+    from seed import BENCH_PASSWORD
+
+    with app.app_context():
+        if not User.query.filter_by(username='bench_0').first():
+            sys.exit("No synthetic data: run 'python bench.py seed' first.")
+        counter = StatementCounter(db.engine)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench_0', 'password': BENCH_PASSWORD})
+    rng = random.Random(1)
+
+    def add_product(n):
+        return client.post('/add-product', data={
+            'name': f'Bench Product {n}', 'description': 'Benchmark item.',
+            'price': f'{rng.uniform(50, 500):.2f}', 'stock': str(rng.randint(1, 50)),
+            'category': 'Bench Category 0'})
+
+    routes = {
+        'GET /myshop': lambda n: client.get('/myshop'),
+        'GET /myshop (revalidate)': lambda n: client.get('/myshop', headers={'If-None-Match': etag}),
+        'GET /dashboard': lambda n: client.get('/dashboard'),
+        'GET /profile': lambda n: client.get('/profile'),
+        'GET /search': lambda n: client.get('/search?q=handmade'),
+        'GET /login': lambda n: client.get('/login'),
+        'POST /add-product': add_product,
+    }
+    client.get('/myshop')   # takes the login flash: a page carrying one is sent no-store
+    etag = client.get('/myshop').headers.get('ETag')
+    if not etag:
+        sys.exit('GET /myshop sent no ETag: nothing to revalidate.')
+
+    results = {}
+    for name, call in routes.items():
+        call(-1)  # warm-up: template compilation, caches
+        timings, statements, statuses = [], [], {}
+        for n in range(args.requests):
+            before = counter.count
+            started = time.perf_counter()
+            response = call(n)
+            timings.append((time.perf_counter() - started) * 1000)
+            statements.append(counter.count - before)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        results[name] = {
+            'latency_ms': percentiles(timings),
+            'queries_per_request': percentiles(statements),
+            'status_codes': statuses,
+        }
+
+    # Login separately: every iteration pays the configured password hash cost
+    timings = []
+    for _ in range(max(1, args.requests // 10)):
+        fresh = app.test_client()
+        started = time.perf_counter()
+        fresh.post('/login', data={'username': 'bench_0', 'password': BENCH_PASSWORD})
+        timings.append((time.perf_counter() - started) * 1000)
+    results['POST /login'] = {'latency_ms': percentiles(timings)}
+
+    emit({'benchmark': 'routes', 'requests_per_route': args.requests, 'routes': results}, args.output)
+    revalidated = results['GET /myshop (revalidate)']['status_codes']
+    if set(revalidated) != {304}:
+        sys.exit(f'GET /myshop (revalidate) answered {revalidated}; expected only 304s.')
+
+
+# --- LOAD (concurrent users against a running server) ---
+CSRF_TOKEN_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def cmd_load(args):
+    from seed import BENCH_PASSWORD
+
+    base = args.url.rstrip('/')
+    deadline = time.monotonic() + args.duration
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    weighted = [('/myshop', 5), ('/dashboard', 2), ('/search?q=woven', 2), ('/profile', 1)]
+    paths = [path for path, weight in weighted for _ in range(weight)]
+
+    def record(name, elapsed_ms, ok):
+        with lock:
+            samples.setdefault(name, []).append(elapsed_ms)
+            if not ok:
+                errors[name] = errors.get(name, 0) + 1
+
+    def timed(opener, name, url, data=None):
+        """Body of url after redirects, or None on failure (including being sent to /login)."""
+        started = time.perf_counter()
+        body = None
+        try:
+            with opener.open(url, data=data, timeout=30) as response:
+                text = response.read().decode('utf-8', 'replace')
+                landed = urllib.parse.urlsplit(response.geturl()).path
+                if response.status < 400 and (landed.rstrip('/') != '/login' or url.endswith('/login')):
+                    body = text
+        except Exception:
+            pass
+        record(name, (time.perf_counter() - started) * 1000, body is not None)
+        return body
+
+    def user(n):
+        rng = random.Random(n)
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        username = f'bench_{n % args.shops}'
+        page = timed(opener, 'GET /login', base + '/login')
+        token = CSRF_TOKEN_RE.search(page or '')
+        form = urllib.parse.urlencode({'username': username, 'password': BENCH_PASSWORD,
+                                       'csrf_token': token.group(1) if token else ''}).encode()
+        # A good login redirects away from /login; a failed one re-renders the form
+        started = time.perf_counter()
+        try:
+            with opener.open(base + '/login', data=form, timeout=30) as response:
+                response.read()
+                logged_in = urllib.parse.urlsplit(response.geturl()).path.rstrip('/') != '/login'
+        except Exception:
+            logged_in = False
+        record('POST /login', (time.perf_counter() - started) * 1000, logged_in)
+        if not logged_in:
+            return  # anything further would only measure the login page
+        while time.monotonic() < deadline:
+            path = rng.choice(paths)
+            timed(opener, 'GET ' + path.split('?')[0], base + path)
+            if args.think:
+                time.sleep(rng.uniform(0, args.think))
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in samples.values())
+    emit({
+        'benchmark': 'load', 'url': base, 'users': args.users, 'duration_s': round(elapsed, 3),
+        'requests': total, 'throughput_rps': round(total / elapsed, 2),
+        'routes': {name: {'latency_ms': percentiles(values), 'errors': errors.get(name, 0)}
+                   for name, values in samples.items()},
+    }, args.output)
+
+
+# --- FLASH SALE (concurrent checkouts of one scarce item) ---
+def cmd_flash_sale(args):
+    from sqlalchemy import func
+    from app import create_app
+    app = create_app()
+    from models import db, User, Shop, Item, CartLine, OrderLine
+    from seed import BENCH_PASSWORD, seed_buyers
+    from categories import category_id
+    from stats import item_added
+    from fragments import bump_shop
+
+    with app.app_context():
+        shop = Shop.query.order_by(Shop.shop_id).first()
+        if shop is None:
+            sys.exit("No shops: run 'python bench.py seed' first.")
+        usernames = seed_buyers(args.buyers)
+        buyer_ids = [user_id for (user_id,) in
+                     db.session.query(User.user_id).filter(User.username.in_(usernames))]
+        CartLine.query.filter(CartLine.user_id.in_(buyer_ids)).delete(synchronize_session=False)
+        item = Item(name='Flash Sale Item', description='Limited run.', price=99.0,
+                    stock=args.stock, img_url='products/default.jpg',
+                    category_id=category_id('Flash Sale'), shop_id=shop.shop_id)
+        db.session.add(item)
+        item_added(item)
+        bump_shop(shop.shop_id)
+        db.session.commit()
+        item_id = item.item_id
+
+    # Every buyer logs in and fills their cart first, then all check out at once
+    barrier = threading.Barrier(args.buyers)
+    timings, statuses = [], {}
+    lock = threading.Lock()
+
+    def buyer(username):
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+        client.post(f'/cart/add/{item_id}', data={'quantity': args.quantity})
+        barrier.wait()
+        started = time.perf_counter()
+        response = client.post('/checkout')
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            timings.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=buyer, args=(name,)) for name in usernames]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stock_left = db.session.get(Item, item_id).stock
+        sold = db.session.query(func.coalesce(func.sum(OrderLine.quantity), 0)) \
+            .filter(OrderLine.item_id == item_id).scalar()
+        orders = db.session.query(func.count()).filter(OrderLine.item_id == item_id).scalar()
+
+    emit({
+        'benchmark': 'flash-sale', 'buyers': args.buyers, 'quantity_each': args.quantity,
+        'stock_start': args.stock, 'orders': orders, 'units_sold': sold, 'stock_left': stock_left,
+        'oversold': sold > args.stock or stock_left < 0,
+        'consistent': args.stock - sold == stock_left,
+        'expected_units_sold': min(args.stock // args.quantity, args.buyers) * args.quantity,
+        'duration_s': round(elapsed, 3),
+        'checkout_latency_ms': percentiles(timings),
+        'status_codes': statuses,
+    }, args.output)
+
+
+# --- STARTUP (cold start of a worker process) ---
+_STARTUP_PROBE = '''
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+create_app()
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'create_ms': (t2 - t1) * 1000}))
+'''
+
+
+def _slowest_imports(here, top):
+    """Modules app.py imports directly, by cumulative import time (python -X importtime)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=here, capture_output=True, text=True)
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, _, rest = line.partition(':')
+        _, cumulative, module = rest.split('|')
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if depth == 1:  # imported by app.py itself
+            timings.append((int(cumulative) / 1000, module.strip()))
+    return [{'module': module, 'cumulative_ms': round(ms, 1)}
+            for ms, module in sorted(timings, reverse=True)[:top]]
+
+
+def cmd_startup(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    totals, imports, creates = [], [], []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-c', _STARTUP_PROBE], cwd=here,
+                              capture_output=True, text=True)
+        wall = (time.perf_counter() - started) * 1000
+        if proc.returncode != 0:
+            sys.exit(proc.stderr)
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        totals.append(wall)
+        imports.append(probe['import_ms'])
+        creates.append(probe['create_ms'])
+
+    result = {
+        'benchmark': 'startup', 'runs': args.runs, 'budget_ms': args.budget_ms,
+        'process_wall_ms': percentiles(totals),
+        'import_ms': percentiles(imports),
+        'create_app_ms': percentiles(creates),
+        'slowest_imports': _slowest_imports(here, 10),
+    }
+    result['within_budget'] = result['process_wall_ms']['p95'] <= args.budget_ms
+    emit(result, args.output)
+    if not result['within_budget']:
+        sys.exit(1)
+
+
+# --- SNAPSHOT (columnar catalogue snapshot vs SQL) ---
+def cmd_snapshot(args):
+    from sqlalchemy import func, select, update
+    from app import create_app
+    app = create_app()
+    from models import db, Item, Category
+    from catalog import PRICE_BUCKETS
+    from fragments import bump_shop
+    from snapshot import catalog_snapshot, np
+
+    catalog_snapshot.init_app(app)   # even when CATALOG_SNAPSHOT is off
+    with app.app_context():
+        total = db.session.query(func.count(Item.item_id)).scalar()
+        if total < args.items:
+            sys.exit(f"{total} items, fewer than --items {args.items}: seed more first, e.g. "
+                     f"'python bench.py seed --shops 1000 --items 1000 --categories 50'.")
+        category_ids = [category_id for (category_id,) in db.session.query(Category.id)]
+        rng = random.Random(args.seed)
+        cases = [(rng.choice(category_ids), *rng.choice(PRICE_BUCKETS)[1:]) for _ in range(args.queries)]
+
+        def sql_ids(category_id, lower, upper):
+            stmt = select(Item.item_id).where(Item.category_id == category_id, Item.price >= lower)
+            if upper is not None:
+                stmt = stmt.where(Item.price < upper)
+            return db.session.execute(stmt.order_by(Item.price, Item.item_id).limit(args.limit)).scalars().all()
+
+        def hydrate(ids):
+            by_id = {item.item_id: item for item in Item.query.filter(Item.item_id.in_(ids))} if ids else {}
+            return [by_id[item_id] for item_id in ids if item_id in by_id]
+
+        snapshot = catalog_snapshot.store()
+        started = time.perf_counter()
+        snapshot.sync()
+        load_s = time.perf_counter() - started
+
+        timings = {'sql_ids': [], 'snapshot_ids': [], 'sql_rows': [], 'snapshot_hydrated': []}
+        mismatches = 0
+        for category_id, lower, upper in cases:
+            started = time.perf_counter()
+            expected = sql_ids(category_id, lower, upper)
+            timings['sql_ids'].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            ids = snapshot.price_range(lower, upper, category_id, limit=args.limit)
+            timings['snapshot_ids'].append((time.perf_counter() - started) * 1000)
+            mismatches += ids != expected
+
+            started = time.perf_counter()
+            Item.query.filter(Item.category_id == category_id, Item.price >= lower,
+                              *([Item.price < upper] if upper is not None else [])) \
+                .order_by(Item.price, Item.item_id).limit(args.limit).all()
+            timings['sql_rows'].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            hydrate(snapshot.price_range(lower, upper, category_id, limit=args.limit))
+            timings['snapshot_hydrated'].append((time.perf_counter() - started) * 1000)
+            db.session.expunge_all()
+
+        # Incremental refresh: reprice one item (the commit marks the snapshot
+        # stale), time the sync that reloads its shop, then put the price back
+        item_id, shop_id, price = db.session.query(Item.item_id, Item.shop_id, Item.price) \
+            .order_by(Item.item_id).first()
+        db.session.execute(update(Item).where(Item.item_id == item_id)
+                           .values(price=price + 0.01, revision=Item.revision + 1))
+        bump_shop(shop_id)
+        db.session.commit()
+        started = time.perf_counter()
+        snapshot.sync()
+        refresh_ms = (time.perf_counter() - started) * 1000
+        db.session.execute(update(Item).where(Item.item_id == item_id)
+                           .values(price=price, revision=Item.revision + 1))
+        bump_shop(shop_id)
+        db.session.commit()
+
+        result = {
+            'benchmark': 'snapshot', 'items': total, 'queries': args.queries, 'limit': args.limit,
+            'backend': 'numpy' if np is not None else 'array',
+            'load_s': round(load_s, 3),
+            'refresh_one_shop_ms': round(refresh_ms, 3),
+            'memory_bytes': snapshot.stats()['bytes'],
+            'mismatches': mismatches,
+            'latency_ms': {name: percentiles(values) for name, values in timings.items()},
+        }
+        sql_p50, snap_p50 = result['latency_ms']['sql_ids']['p50'], result['latency_ms']['snapshot_ids']['p50']
+        result['ids_speedup_p50'] = round(sql_p50 / snap_p50, 2) if snap_p50 else None
+        emit(result, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    seed = sub.add_parser('seed', help='generate N shops x M items x K categories')
+    seed.add_argument('--shops', type=int, default=10)
+    seed.add_argument('--items', type=int, default=100, help='items per shop')
+    seed.add_argument('--categories', type=int, default=10)
+    seed.set_defaults(func=cmd_seed)
+
+    routes = sub.add_parser('routes', help='micro-benchmark each route via the test client')
+    routes.add_argument('--requests', type=int, default=100, help='requests per route')
+    routes.set_defaults(func=cmd_routes)
+
+    load = sub.add_parser('load', help='concurrent simulated users against a running server')
+    load.add_argument('--url', default='http://127.0.0.1:5000')
+    load.add_argument('--users', type=int, default=10)
+    load.add_argument('--shops', type=int, default=10, help='synthetic shops to log in as')
+    load.add_argument('--duration', type=float, default=30.0, help='seconds')
+    load.add_argument('--think', type=float, default=0.0, help='max think time between requests (s)')
+    load.set_defaults(func=cmd_load)
+
+    sale = sub.add_parser('flash-sale', help='concurrent checkouts of one scarce item')
+    sale.add_argument('--buyers', type=int, default=100)
+    sale.add_argument('--stock', type=int, default=25)
+    sale.add_argument('--quantity', type=int, default=1, help='units each buyer orders')
+    sale.set_defaults(func=cmd_flash_sale)
+
+    startup = sub.add_parser('startup', help='cold-start time of a worker process')
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--budget-ms', type=float, default=800.0,
+                         help='fail if the p95 process wall time exceeds this')
+    startup.set_defaults(func=cmd_startup)
+
+    snapshot = sub.add_parser('snapshot', help='columnar catalogue snapshot vs SQL for price-range queries')
+    snapshot.add_argument('--items', type=int, default=1000000, help='minimum items expected in the database')
+    snapshot.add_argument('--queries', type=int, default=500)
+    snapshot.add_argument('--limit', type=int, default=24, help='top N per query')
+    snapshot.add_argument('--seed', type=int, default=7, help='random seed for the query mix')
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    for command in (seed, routes, load, sale, startup, snapshot):
+        command.add_argument('--output', help='also write the JSON result to this file')
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
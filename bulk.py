@@ -0,0 +1,182 @@
+import io
+import csv
+import json
+import math
+from itertools import islice
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Item, Category
+from categories import category_ids
+from stats import items_added
+from fragments import bump_shop
+from storage import is_content_addressed, acquire_urls
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ('name', 'description', 'price', 'stock', 'category', 'img_url')
+DEFAULT_IMG_URL = 'products/default.jpg'
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []   # (line number, message), capped at MAX_REPORTED_ERRORS
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+# --- PARSING ---
+def iter_records(binary_stream, fmt):
+    """Yield (line number, dict) from a CSV or JSON Lines byte stream, lazily."""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_num, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_num, exc
+                continue
+            yield line_num, record if isinstance(record, dict) else ValueError('not a JSON object')
+
+
+def _clean(record):
+    """Validate one record; returns column values or raises ValueError."""
+    name = str(record.get('name') or '').strip()
+    category = str(record.get('category') or '').strip().title()
+    if not name or len(name) > 150:
+        raise ValueError('name is required (max 150 characters)')
+    if not category or len(category) > 300:
+        raise ValueError('category is required (max 300 characters)')
+    try:
+        price = float(record.get('price'))
+        stock = int(record.get('stock') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('price must be a number and stock an integer')
+    if not math.isfinite(price):
+        raise ValueError('price must be a finite number')
+    if price < 0 or stock < 0:
+        raise ValueError('price and stock must not be negative')
+    return {
+        'name': name,
+        'description': str(record.get('description') or '').strip() or None,
+        'price': price,
+        'stock': stock,
+        'category': category,
+        'img_url': str(record.get('img_url') or '').strip() or DEFAULT_IMG_URL,
+    }
+
+
+# --- IMPORT ---
+def _acquire_images(rows):
+    """
+    Content-addressed img_urls (e.g. from an export of another shop) share
+    the stored file, so each row takes a reference on its MediaBlob, as an
+    upload would. URLs with no blob behind them fall back to the default.
+    """
+    counts = {}
+    for row in rows:
+        if is_content_addressed(row['img_url']):
+            counts[row['img_url']] = counts.get(row['img_url'], 0) + 1
+    if not counts:
+        return
+    known = acquire_urls(counts)
+    for row in rows:
+        if row['img_url'] in counts and row['img_url'] not in known:
+            row['img_url'] = DEFAULT_IMG_URL
+
+
+def import_items(shop_id, records, batch_size=BATCH_SIZE):
+    """
+    Insert items from (line number, record) pairs into a shop. Rows are
+    validated one by one and inserted per batch with a single executemany
+    INSERT, each batch in its own transaction together with the shop_stats
+    update and the image references. Bad rows are reported and skipped; they never abort a batch.
+    A batch the database rejects is rolled back and each of its rows reported.
+    """
+    report = ImportReport()
+    records = iter(records)
+
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        rows, lines = [], []
+        for line_num, record in chunk:
+            if isinstance(record, Exception):
+                report.error(line_num, str(record))
+                continue
+            try:
+                rows.append(_clean(record))
+                lines.append(line_num)
+            except ValueError as exc:
+                report.error(line_num, str(exc))
+        if not rows:
+            continue
+
+        try:
+            _insert_batch(shop_id, rows)
+        except SQLAlchemyError as exc:
+            db.session.rollback()
+            message = f'not saved, the database rejected its batch: {getattr(exc, "orig", None) or exc}'
+            for line_num in lines:
+                report.error(line_num, message)
+            continue
+        report.inserted += len(rows)
+
+    return report
+
+
+def _insert_batch(shop_id, rows):
+    _acquire_images(rows)
+    categories = category_ids(r['category'] for r in rows)
+    db.session.execute(Item.__table__.insert(), [{
+        'name': r['name'],
+        'description': r['description'],
+        'price': r['price'],
+        'stock': r['stock'],
+        'img_url': r['img_url'],
+        'img_status': 'ready',
+        'category_id': categories[r['category']],
+        'shop_id': shop_id,
+    } for r in rows])
+    items_added(shop_id, [(r['price'], r['stock']) for r in rows])
+    bump_shop(shop_id)
+    db.session.commit()
+
+
+# --- EXPORT ---
+def export_items(shop_id, fmt):
+    """Generate the shop's items as CSV or JSON Lines text, streaming from the DB."""
+    query = (select(Item.name, Item.description, Item.price, Item.stock,
+                    Category.name.label('category'), Item.img_url)
+             .join(Category, Category.id == Item.category_id)
+             .where(Item.shop_id == shop_id)
+             .order_by(Item.item_id)
+             .execution_options(yield_per=BATCH_SIZE))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(COLUMNS)
+
+    for partition in db.session.execute(query).partitions():
+        for row in partition:
+            if fmt == 'csv':
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,119 @@
+from collections import namedtuple
+from sqlalchemy import select, delete, update, case
+from models import db, Item, CartLine, Order, OrderLine
+from inventory import reserve_many, InsufficientStock
+from categories import upsert_insert
+
+MAX_LINE_QUANTITY = 99
+lines_table = CartLine.__table__
+
+CartEntry = namedtuple('CartEntry', 'item_id quantity name price stock img_url shop_id')
+
+
+class Cart:
+    """A user's cart as read by load_cart(): its lines joined with their items."""
+
+    def __init__(self, user_id, entries):
+        self.user_id = user_id
+        self.entries = entries
+
+    @property
+    def quantities(self):
+        return {entry.item_id: entry.quantity for entry in self.entries}
+
+    @property
+    def count(self):
+        return sum(entry.quantity for entry in self.entries)
+
+    @property
+    def total(self):
+        return sum(entry.price * entry.quantity for entry in self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+
+def load_cart(user_id):
+    """The user's cart with current item names, prices and stock; one query."""
+    rows = db.session.execute(
+        select(CartLine.item_id, CartLine.quantity, Item.name, Item.price, Item.stock,
+               Item.img_url, Item.shop_id)
+        .join(Item, Item.item_id == CartLine.item_id)
+        .where(CartLine.user_id == user_id)
+        .order_by(CartLine.added_at, CartLine.item_id)
+    ).all()
+    return Cart(user_id, [CartEntry(*row) for row in rows])
+
+
+def add_to_cart(user_id, item_id, quantity=1):
+    """
+    Add units of an item, merging with an existing line; one upsert. The
+    line is capped at MAX_LINE_QUANTITY. Stock is only checked at checkout.
+    Caller commits.
+    """
+    insert = upsert_insert()
+    if insert is None:
+        # Other backends: bump the line, insert it if there was none
+        merged = db.session.execute(
+            update(lines_table)
+            .where(lines_table.c.user_id == user_id, lines_table.c.item_id == item_id)
+            .values(quantity=_capped(lines_table.c.quantity + quantity)))
+        if merged.rowcount == 0:
+            db.session.execute(lines_table.insert().values(
+                user_id=user_id, item_id=item_id, quantity=min(quantity, MAX_LINE_QUANTITY)))
+        return
+    stmt = insert(lines_table).values(user_id=user_id, item_id=item_id,
+                                      quantity=min(quantity, MAX_LINE_QUANTITY))
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'item_id'],
+        set_={'quantity': _capped(lines_table.c.quantity + stmt.excluded.quantity)}))
+
+
+def _capped(expr):
+    return case((expr > MAX_LINE_QUANTITY, MAX_LINE_QUANTITY), else_=expr)
+
+
+def set_quantity(user_id, item_id, quantity):
+    """Set a line's quantity; 0 removes it. One statement. Caller commits."""
+    where = (lines_table.c.user_id == user_id, lines_table.c.item_id == item_id)
+    if quantity <= 0:
+        db.session.execute(delete(lines_table).where(*where))
+    else:
+        db.session.execute(update(lines_table).where(*where)
+                           .values(quantity=min(quantity, MAX_LINE_QUANTITY)))
+
+
+def checkout(user_id):
+    """
+    Turn the cart into an Order in one transaction: read the cart, reserve
+    every line with one set-based conditional UPDATE (inventory.reserve_many),
+    write the order and its lines, empty the cart, commit. If any line is
+    short nothing is kept and InsufficientStock names the items. Returns
+    the new Order, or None for an empty cart.
+    """
+    cart = load_cart(user_id)
+    if not cart:
+        return None
+    quantities = cart.quantities
+    try:
+        reserved = reserve_many(quantities)
+    except InsufficientStock:
+        db.session.rollback()
+        raise
+
+    # Charge the price the reservation saw, not the one the cart page showed
+    total = sum(price * quantities[item_id] for item_id, (_, price) in reserved.items())
+    order = Order(user_id=user_id, total=total)
+    db.session.add(order)
+    db.session.flush()
+    db.session.execute(OrderLine.__table__.insert(), [{
+        'order_id': order.order_id,
+        'item_id': item_id,
+        'shop_id': shop_id,
+        'quantity': quantities[item_id],
+        'unit_price': price,
+    } for item_id, (shop_id, price) in reserved.items()])
+    db.session.execute(delete(lines_table).where(
+        lines_table.c.user_id == user_id, lines_table.c.item_id.in_(list(quantities))))
+    db.session.commit()
+    return order
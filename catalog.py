@@ -0,0 +1,158 @@
+import json
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload, load_only
+from models import db, Shop, Item, Category
+from fragments import fragment_cache
+from pagination import keyset_page, encode_cursor, decode_cursor, SORTS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# Price facet buckets: (key, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = (
+    ('0-100', 0, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500-1000', 500, 1000),
+    ('1000+', 1000, None),
+)
+BUCKET_KEYS = [key for key, _, _ in PRICE_BUCKETS]
+
+CatalogFilters = namedtuple('CatalogFilters', 'category_id price sort after limit')
+
+
+def parse_filters(args):
+    """CatalogFilters from request args; unknown values fall back to 'no filter'."""
+    price = args.get('price')
+    sort = args.get('sort', 'id')
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return CatalogFilters(
+        category_id=args.get('category', type=int),
+        price=price if price in BUCKET_KEYS else None,
+        sort=sort if sort in SORTS else 'id',
+        after=args.get('after') or None,
+        limit=max(1, min(limit, MAX_PAGE_SIZE)),
+    )
+
+
+def catalog_version():
+    """
+    Changes whenever any shop's listing changes: every item write path bumps
+    its shop's revision (see fragments.bump_shop). One query over shops.
+    """
+    count, total = db.session.query(func.count(Shop.shop_id), func.sum(Shop.revision)).one()
+    return f'{count}.{total or 0}'
+
+
+def _bucket_expr():
+    return case(*[(Item.price < upper, index)
+                  for index, (_, _, upper) in enumerate(PRICE_BUCKETS) if upper is not None],
+                else_=len(PRICE_BUCKETS) - 1)
+
+
+def _facet_rows(version):
+    """(category_id, category_name, bucket_index, count) for the whole catalogue."""
+    key = f'catalog-facets:{version}'
+    cached = fragment_cache.backend.get(key)
+    if cached is not None:
+        return json.loads(cached)
+    bucket = _bucket_expr()
+    rows = [list(row) for row in
+            db.session.query(Category.id, Category.name, bucket, func.count(Item.item_id))
+            .join(Item, Item.category_id == Category.id)
+            .group_by(Category.id, Category.name, bucket)
+            .all()]
+    fragment_cache.backend.set(key, json.dumps(rows))
+    return rows
+
+
+def facet_counts(filters, version):
+    """
+    Category and price-bucket counts from one grouped query. Each facet is
+    counted with the other facet's filter applied but not its own, so the
+    counts show what selecting a value would return.
+    """
+    selected_bucket = BUCKET_KEYS.index(filters.price) if filters.price else None
+    categories, buckets = {}, [0] * len(PRICE_BUCKETS)
+    for category_id, name, bucket, count in _facet_rows(version):
+        if selected_bucket is None or bucket == selected_bucket:
+            entry = categories.setdefault(category_id, {'id': category_id, 'name': name, 'count': 0})
+            entry['count'] += count
+        if filters.category_id is None or category_id == filters.category_id:
+            buckets[bucket] += count
+    return {
+        'categories': sorted(categories.values(), key=lambda c: c['name']),
+        'price': [{'key': key, 'count': count} for key, count in zip(BUCKET_KEYS, buckets)],
+    }
+
+
+def _snapshot_page(snapshot, query, filters, version):
+    """
+    A price-sorted page from the in-process snapshot: ids (plus one to see
+    if there is a next page) from a vectorized scan, then one IN query to
+    hydrate them. Cursors are the same (price, item_id) keys keyset_page uses.
+    """
+    lower = upper = None
+    if filters.price:
+        _, lower, upper = PRICE_BUCKETS[BUCKET_KEYS.index(filters.price)]
+    after = None
+    if filters.after:
+        after = decode_cursor(filters.after, 2)
+    ids = snapshot.price_range(lower, upper, filters.category_id, limit=filters.limit + 1,
+                               after=after, version=version)
+    more = len(ids) > filters.limit
+    ids = ids[:filters.limit]
+    by_id = {item.item_id: item for item in query.filter(Item.item_id.in_(ids))} if ids else {}
+    # An item deleted since the snapshot synced simply drops out of the page
+    items = [by_id[item_id] for item_id in ids if item_id in by_id]
+    if not (more and items):
+        return items, None
+    return items, encode_cursor([items[-1].price, items[-1].item_id])
+
+
+def _page(filters, version):
+    query = Item.query.options(
+        load_only(Item.item_id, Item.name, Item.price, Item.stock, Item.img_url,
+                  Item.img_status, Item.shop_id, Item.category_id),
+        joinedload(Item.category).load_only(Category.name))
+    snapshot = current_app.extensions.get('catalog_snapshot')
+    if snapshot is not None and filters.sort == 'price':
+        items, next_cursor = _snapshot_page(snapshot, query, filters, version)
+        return _serialize(items), next_cursor
+    if filters.category_id is not None:
+        query = query.filter(Item.category_id == filters.category_id)
+    if filters.price:
+        _, lower, upper = PRICE_BUCKETS[BUCKET_KEYS.index(filters.price)]
+        query = query.filter(Item.price >= lower)
+        if upper is not None:
+            query = query.filter(Item.price < upper)
+    items, next_cursor = keyset_page(query, filters.sort, filters.after, filters.limit)
+    return _serialize(items), next_cursor
+
+
+def _serialize(items):
+    return [{
+        'item_id': item.item_id,
+        'name': item.name,
+        'price': item.price,
+        'stock': item.stock,
+        'category': item.category.name if item.category else None,
+        'shop_id': item.shop_id,
+        'img_url': item.img_url,
+        'img_status': item.img_status,
+    } for item in items]
+
+
+def browse(filters, version):
+    """
+    One catalogue page plus facets, cached per (catalogue version, filter
+    combination). Raises pagination.InvalidCursor for a malformed cursor.
+    """
+    key = 'catalog:{}:{}'.format(version, ':'.join(map(str, filters)))
+    cached = fragment_cache.backend.get(key)
+    fragment_cache.count(cached is not None)
+    if cached is not None:
+        return json.loads(cached)
+    items, next_cursor = _page(filters, version)
+    result = {'items': items, 'next_cursor': next_cursor, 'facets': facet_counts(filters, version)}
+    fragment_cache.backend.set(key, json.dumps(result))
+    return result
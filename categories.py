@@ -0,0 +1,145 @@
+import threading
+import importlib
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Category
+
+UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+
+def upsert_insert():
+    """
+    The ON CONFLICT-capable insert() of the session's dialect, or None where
+    there isn't one. Dialect modules are imported on first use.
+    """
+    name = db.session.get_bind().dialect.name
+    if name not in UPSERT_DIALECTS:
+        return None
+    return importlib.import_module(f'sqlalchemy.dialects.{name}').insert
+
+
+def normalize(name):
+    """The stored form of a category name: trimmed and title-cased."""
+    return name.strip().title()
+
+
+class CategoryCache:
+    """
+    Normalized category name -> id, bounded LRU. Only ids of committed rows
+    are cached: ids created inside a transaction are held on the session
+    and promoted when it commits (dropped if it rolls back).
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        with self._lock:
+            category_id = self._ids.get(name)
+            if category_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._ids.move_to_end(name)
+            return category_id
+
+    def put_many(self, ids):
+        with self._lock:
+            self._ids.update(ids)
+            for name in ids:
+                self._ids.move_to_end(name)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def invalidate(self, name=None):
+        """Forget one name (e.g. after a rename or delete), or everything."""
+        with self._lock:
+            if name is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(normalize(name), None)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._ids)
+        return {'size': size, 'hits': self.hits, 'misses': self.misses}
+
+
+category_cache = CategoryCache()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _promote_created(session):
+    created = session.info.pop('created_categories', None)
+    if created:
+        category_cache.put_many(created)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_created(session):
+    session.info.pop('created_categories', None)
+
+
+def _insert_missing(names):
+    """
+    Create any of `names` that don't exist yet, in the caller's transaction.
+    ON CONFLICT DO NOTHING makes a concurrent insert of the same name a no-op
+    instead of an IntegrityError; RETURNING hands back the new ids directly.
+    Returns {name: id} for the rows this statement created.
+    """
+    insert = upsert_insert()
+    if insert is None:
+        # Other backends: plain inserts, each under a savepoint so losing the race is harmless
+        created = {}
+        for name in names:
+            try:
+                with db.session.begin_nested():
+                    created[name] = db.session.execute(
+                        Category.__table__.insert().values(name=name)).inserted_primary_key[0]
+            except IntegrityError:
+                pass
+        return created
+    stmt = (insert(Category.__table__)
+            .values([{'name': name} for name in names])
+            .on_conflict_do_nothing(index_elements=['name'])
+            .returning(Category.name, Category.id))
+    return dict(db.session.execute(stmt).all())
+
+
+def category_ids(names):
+    """
+    Resolve category names to ids, creating missing categories without
+    committing. Returns {normalized name: id}. Cached names cost nothing;
+    the rest take one upsert plus, for names that already existed, one SELECT.
+    """
+    resolved, missing = {}, set()
+    for name in {normalize(n) for n in names}:
+        cached = category_cache.get(name)
+        if cached is None:
+            missing.add(name)
+        else:
+            resolved[name] = cached
+    if not missing:
+        return resolved
+
+    created = _insert_missing(sorted(missing))
+    db.session.info.setdefault('created_categories', {}).update(created)
+    resolved.update(created)
+
+    existing = missing - created.keys()
+    if existing:
+        found = dict(db.session.execute(
+            select(Category.name, Category.id).where(Category.name.in_(existing))).all())
+        category_cache.put_many(found)
+        resolved.update(found)
+    return resolved
+
+
+def category_id(name):
+    """Id of the category called `name` (normalized), created if needed; no commit."""
+    return category_ids([name])[normalize(name)]
@@ -0,0 +1,132 @@
+"""
+`flask` CLI commands. Each imports what it needs when it runs, so
+registering them costs nothing at app start.
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from bulk import FORMATS
+
+seed_cli = AppGroup('seed', help='Load default or synthetic data. Every command is idempotent.')
+
+
+def register_commands(app):
+    for command in (init_db, sync_replicas, reconcile_stats, rebuild_search, import_items_command,
+                    export_items_command, compress_static_command, seed_cli):
+        app.cli.add_command(command)
+
+
+# First revision in migrations/: the tables as they were before migrations existed
+BASELINE_REVISION = 'cb359aac6694'
+
+
+@click.command('init-db')
+def init_db():
+    """Create or upgrade the schema with the migrations; never drops data."""
+    from sqlalchemy import inspect
+    from flask_migrate import upgrade, stamp
+    from models import db
+    tables = inspect(db.engine).get_table_names()
+    if tables and 'alembic_version' not in tables:
+        # Made by create_all() before migrations existed: start from the
+        # baseline; later revisions skip whatever create_all() already added
+        stamp(revision=BASELINE_REVISION)
+        click.echo(f'Existing database stamped at {BASELINE_REVISION}.')
+    upgrade()
+    click.echo('Database ready.')
+
+
+@click.command('sync-replicas')
+def sync_replicas():
+    """Copy the primary into SQLite replica files (local replica stand-in)."""
+    from models import db
+    from replicas import sync_sqlite_replicas
+    copied = sync_sqlite_replicas(db.engine, current_app.extensions['replicas'])
+    click.echo(f'{copied} replica(s) refreshed.')
+
+
+@click.command('reconcile-stats')
+@click.option('--fix', is_flag=True, help='Overwrite drifted summaries with the recomputed totals.')
+def reconcile_stats(fix):
+    """Recompute shop_stats from items and report any drift."""
+    from stats import reconcile
+    drift = reconcile(fix=fix)
+    for shop_id, stored, actual in drift:
+        click.echo(f'shop {shop_id}: stored={stored} actual={actual}')
+    click.echo(f'{len(drift)} shop(s) drifted' + (', fixed.' if fix and drift else '.'))
+
+
+@click.command('rebuild-search')
+def rebuild_search():
+    """Repopulate the items_fts full-text index from items."""
+    from search import rebuild_index
+    rebuild_index()
+    click.echo('Search index rebuilt.')
+
+
+@click.command('import-items')
+@click.argument('shop_id', type=int)
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--batch-size', type=int, default=1000)
+def import_items_command(shop_id, source, fmt, batch_size):
+    """Stream items from a CSV/JSONL file (or '-' for stdin) into a shop."""
+    from models import db, Shop
+    from bulk import iter_records, import_items
+    if db.session.get(Shop, shop_id) is None:
+        raise click.BadParameter(f'no shop with id {shop_id}', param_hint='SHOP_ID')
+    fmt = fmt or ('jsonl' if source.name.endswith('.jsonl') else 'csv')
+    report = import_items(shop_id, iter_records(source, fmt), batch_size)
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    click.echo(f'{report.inserted} inserted, {report.failed} rejected.')
+
+
+@click.command('export-items')
+@click.argument('shop_id', type=int)
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv')
+def export_items_command(shop_id, fmt):
+    """Stream a shop's items to stdout as CSV/JSONL."""
+    from bulk import export_items
+    for chunk in export_items(shop_id, fmt):
+        click.echo(chunk, nl=False)
+
+
+@click.command('compress-static')
+@click.option('--force', is_flag=True, help='Rebuild variants even if they are up to date.')
+def compress_static_command(force):
+    """Write precompressed .gz/.br variants of static CSS/JS/SVG files."""
+    from media import compress_static
+    written = compress_static(current_app.static_folder, force=force)
+    click.echo(f'{written} precompressed file(s) written.')
+
+
+# --- SEED ---
+@seed_cli.command('defaults')
+def seed_defaults():
+    """The default admin user, their shop and its sample items."""
+    from seed import create_default_user, create_default_shop, seed_shop_items
+    create_default_user()
+    create_default_shop()
+    seed_shop_items()
+
+
+@seed_cli.command('synthetic')
+@click.option('--shops', type=int, default=10)
+@click.option('--items', type=int, default=100, help='Items per shop.')
+@click.option('--categories', type=int, default=10)
+@click.option('--seed', 'rng_seed', type=int, default=42, help='Random seed.')
+def seed_synthetic_command(shops, items, categories, rng_seed):
+    """Benchmark shops 'bench_<n>' with generated items (bulk-loaded)."""
+    from seed import seed_synthetic
+    seed_synthetic(shops, items, categories, rng_seed)
+
+
+@seed_cli.command('buyers')
+@click.argument('count', type=int)
+def seed_buyers_command(count):
+    """Buyer accounts 'buyer_<n>' for load tests."""
+    from seed import seed_buyers
+    seed_buyers(count)
+    click.echo(f'{count} buyer account(s) ready.')
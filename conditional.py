@@ -0,0 +1,94 @@
+import os
+import time
+import hashlib
+from flask import g, request, session, current_app, abort, Response
+from flask_login import current_user
+
+
+def _release_id():
+    """
+    Fingerprint of the templates and top-level static files, computed once per
+    process. Part of every page ETag so a deploy that changes markup or asset
+    URLs never gets a 304 for the old page.
+    """
+    cached = current_app.extensions.get('release_id')
+    if cached is None:
+        sha = hashlib.sha1()
+        folders = (os.path.join(current_app.root_path, current_app.template_folder),
+                   current_app.static_folder)
+        for folder in folders:
+            for name in sorted(os.listdir(folder)):
+                path = os.path.join(folder, name)
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    sha.update(f'{name}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+        cached = current_app.extensions['release_id'] = sha.hexdigest()[:12]
+    return cached
+
+
+def page_etag(*parts):
+    """Strong ETag value derived from the row revisions a page is built from."""
+    return hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def form_token_window():
+    """
+    ETag part for pages that embed CSRF tokens. It changes every half
+    WTF_CSRF_TIME_LIMIT, so a 304 never keeps a page whose token has less
+    than half its lifetime left. None when tokens are off or never expire.
+    """
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not current_app.config.get('WTF_CSRF_ENABLED', True) or not limit:
+        return None
+    return int(time.time() // (limit / 2))
+
+
+def conditional(*parts, last_modified=None):
+    """
+    Declare what the current page is built from. The ETag combines `parts`
+    (ids and row revisions, never the rendered body) with the viewer, the
+    URL and the release. If the client already has it, the request ends here
+    with 304 Not Modified, before any further queries or template rendering.
+    Otherwise the validators are attached to the response on the way out.
+    """
+    viewer = (current_user.get_id(), getattr(current_user, 'shop_id', None)) \
+        if current_user.is_authenticated else None
+    # Flashed messages are part of the page but not of the ETag: render them,
+    # and keep this one-off copy out of every cache so a later revalidation
+    # can't bring the flash back.
+    if '_flashes' in session:
+        g.conditional = None
+        return
+    etag = page_etag(_release_id(), viewer, request.full_path, *parts)
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+    g.conditional = (etag, last_modified)
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since
+                     and last_modified <= request.if_modified_since.replace(tzinfo=None))
+    if fresh:
+        response = Response(status=304)
+        _set_validators(response, etag, last_modified)
+        abort(response)
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Private pages: browsers may keep them but must revalidate every time.
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+
+def add_validators(response):
+    """after_request hook: attach the validators declared by conditional()."""
+    if 'conditional' not in g:
+        return response
+    declared = g.pop('conditional')
+    if declared is None:
+        response.headers['Cache-Control'] = 'no-store'
+    elif response.status_code == 200:
+        _set_validators(response, *declared)
+    return response
@@ -0,0 +1,124 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///Web_app.db')
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url, prefix='DB'):
+    """
+    Pool settings for SQLALCHEMY_ENGINE_OPTIONS, tuned per backend. `prefix`
+    selects the env vars (DB_POOL_SIZE, DB_REPLICA_POOL_SIZE, ...), so
+    replicas can be sized separately from the primary.
+    """
+    url = str(url)
+    if url.startswith('sqlite'):
+        if ':memory:' in url or url in ('sqlite://', 'sqlite:///'):
+            return {}
+        return {
+            'pool_size': _env_int(f'{prefix}_POOL_SIZE', 5),
+            'max_overflow': _env_int(f'{prefix}_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int(f'{prefix}_POOL_TIMEOUT', 30),
+            # sqlite3's own lock wait, in seconds; busy_timeout pragma mirrors it
+            'connect_args': {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000},
+        }
+    return {
+        'pool_size': _env_int(f'{prefix}_POOL_SIZE', 10),
+        'max_overflow': _env_int(f'{prefix}_MAX_OVERFLOW', 20),
+        'pool_timeout': _env_int(f'{prefix}_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int(f'{prefix}_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+def _replica_urls(env_name):
+    """Comma-separated replica URLs from the environment."""
+    return [url.strip() for url in os.environ.get(env_name, '').split(',') if url.strip()]
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key')
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    UPLOAD_FOLDER = 'static/artisans'
+
+    # Read replicas for GET requests (see replicas.py); pools sized by the
+    # DB_REPLICA_* variables. After a write, that client reads from the
+    # primary for this many seconds.
+    SQLALCHEMY_REPLICAS = _replica_urls('DATABASE_REPLICA_URLS')
+    REPLICA_READ_YOUR_WRITES_SECONDS = _env_int('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+
+    # Applied to every new SQLite connection (see models.tune_sqlite)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+
+    # Password hashing: 'scrypt' (default), 'pbkdf2' or 'argon2' (needs argon2-cffi).
+    # Changing scheme or cost rehashes each user's password on their next login.
+    PASSWORD_HASH_SCHEME = os.environ.get('PASSWORD_HASH_SCHEME', 'scrypt')
+    PASSWORD_SCRYPT_N = _env_int('PASSWORD_SCRYPT_N', 32768)
+    PASSWORD_VERIFY_WORKERS = _env_int('PASSWORD_VERIFY_WORKERS', 2)
+    PASSWORD_VERIFY_QUEUE = _env_int('PASSWORD_VERIFY_QUEUE', 16)
+
+    # Rendered fragment cache: 'memory' (per process), 'filesystem' or 'redis'
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    FRAGMENT_CACHE_URL = os.environ.get('FRAGMENT_CACHE_URL', 'redis://localhost:6379/0')
+
+    # How static files and media are sent: 'flask', 'sendfile' (app serves via
+    # wsgi.file_wrapper/os.sendfile), 'x-accel' (nginx) or 'x-sendfile'
+    # (Apache/lighttpd). See media.py.
+    MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'flask')
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/_static/')
+
+    # Requests slower than this are logged (JSON, with their slowest SQL) to
+    # the 'web_app.slow_requests' logger. /metrics requires METRICS_TOKEN as a
+    # Bearer token and is disabled (403) while it is unset.
+    SLOW_REQUEST_MS = _env_int('SLOW_REQUEST_MS', 500)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # In-process columnar catalogue snapshot for price-sorted catalogue pages
+    # (see snapshot.py); uses NumPy when installed. Without a catalogue
+    # version to compare, it re-checks shop revisions after MAX_AGE seconds.
+    CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT') == '1'
+    CATALOG_SNAPSHOT_MAX_AGE = _env_int('CATALOG_SNAPSHOT_MAX_AGE', 5)
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    # Cheap hashes keep test logins fast
+    PASSWORD_HASH_SCHEME = 'pbkdf2'
+    PASSWORD_PBKDF2_ITERATIONS = 1000
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # e.g. sqlite:///test_replica.db as a local replica stand-in
+    SQLALCHEMY_REPLICAS = _replica_urls('TEST_DATABASE_REPLICA_URLS')
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+
+def get_config(name=None):
+    """Config class named by `name` or the APP_CONFIG env var (default: development)."""
+    return CONFIGS[name or os.environ.get('APP_CONFIG', 'development')]
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, TextAreaField, DecimalField, IntegerField, DateField 
+from wtforms import SelectField, StringField, PasswordField, BooleanField, TextAreaField, DecimalField, IntegerField, DateField, HiddenField
 from wtforms.validators import DataRequired, Length, EqualTo, NumberRange, Optional
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 
 class RegistrationForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=4, max=25)])
@@ -45,12 +45,28 @@ class ItemForm(FlaskForm):
     stock = IntegerField('Available Stock', validators=[DataRequired(), NumberRange(min=0)])
     image = FileField('Product Image', validators=[FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!')])
     category = StringField('Category', validators=[DataRequired(), Length(max=300)])
+    # Item.revision the form was loaded at, for conflict detection on edit
+    revision = HiddenField()
+
+class ItemImportForm(FlaskForm):
+    # Columns: name, description, price, stock, category, img_url (optional)
+    file = FileField('Catalogue File (CSV or JSON Lines)', validators=[FileRequired(),
+        FileAllowed(['csv', 'jsonl'], 'CSV or JSON Lines only!')
+    ])
 
     
 
 
 class Add_to_cart(FlaskForm):
+    quantity = IntegerField('Quantity', default=1, validators=[DataRequired(), NumberRange(min=1, max=99)])
+
+class CartLineForm(FlaskForm):
+    # 0 removes the line
+    quantity = IntegerField('Quantity', validators=[NumberRange(min=0, max=99)])
+
+class CheckoutForm(FlaskForm):
     pass
 
 class Rate_shop(FlaskForm):
-    pass
\ No newline at end of file
+    stars = SelectField('Rating', coerce=int, choices=[(n, '★' * n) for n in range(5, 0, -1)],
+                        validators=[DataRequired()])
\ No newline at end of file
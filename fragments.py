@@ -0,0 +1,173 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from flask import render_template, current_app
+from markupsafe import Markup
+from models import db, Shop
+
+
+# --- BACKENDS ---
+# All backends store str values under str keys. Keys embed row revisions, so
+# entries are never invalidated in place; stale ones simply stop being read
+# and age out.
+class MemoryBackend:
+    """In-process LRU; the default."""
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class FileSystemBackend:
+    """One file per entry; shared by every process on the host."""
+
+    def __init__(self, directory, ttl=24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as fh:
+                stored_key, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if stored_key == key else None
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp, 'wb') as fh:
+            pickle.dump((key, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+
+class RedisBackend:
+    """Any Redis-protocol server (Redis, Valkey, KeyDB...). Needs the `redis` package."""
+
+    def __init__(self, url, ttl=24 * 3600, prefix='frag:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value.encode(), ex=self.ttl)
+
+
+# --- CACHE ---
+class FragmentCache:
+    """
+    Caches rendered template fragments under revision-versioned keys. Each
+    app's backend and hit counters live in app.extensions['fragment_cache'].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_BACKEND', 'memory')
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', 5000)
+        app.config.setdefault('FRAGMENT_CACHE_DIR', os.path.join(app.instance_path, 'fragments'))
+        app.config.setdefault('FRAGMENT_CACHE_URL', 'redis://localhost:6379/0')
+
+        kind = app.config['FRAGMENT_CACHE_BACKEND']
+        if kind == 'filesystem':
+            backend = FileSystemBackend(app.config['FRAGMENT_CACHE_DIR'])
+        elif kind == 'redis':
+            backend = RedisBackend(app.config['FRAGMENT_CACHE_URL'])
+        else:
+            backend = MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'])
+        app.extensions['fragment_cache'] = FragmentStore(backend)
+        app.jinja_env.globals['cached_fragment'] = self.render
+        app.jinja_env.globals['card_key'] = card_key
+
+    @property
+    def store(self):
+        return current_app.extensions['fragment_cache']
+
+    @property
+    def backend(self):
+        return self.store.backend
+
+    def count(self, hit):
+        store = self.store
+        if hit:
+            store.hits += 1
+        else:
+            store.misses += 1
+
+    def render(self, key, template, **context):
+        """Return the rendered `template` for `key`, rendering only on a miss."""
+        backend = self.backend
+        html = backend.get(key)
+        self.count(html is not None)
+        if html is None:
+            html = render_template(template, **context)
+            backend.set(key, html)
+        return Markup(html)
+
+    def stats(self):
+        store = self.store
+        total = store.hits + store.misses
+        return {'backend': type(store.backend).__name__, 'hits': store.hits,
+                'misses': store.misses, 'hit_ratio': store.hits / total if total else None}
+
+
+class FragmentStore:
+    """One app's fragment backend and hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+
+fragment_cache = FragmentCache()
+
+
+def card_key(item):
+    return f'card:{item.item_id}:{item.revision}'
+
+
+# --- REVISIONS ---
+# Item.revision is the mapper's version_id_col, so ORM updates bump it on
+# their own; Core UPDATEs on items must set revision = revision + 1 too.
+# Shop revisions are bumped explicitly by every write path that changes
+# what a shop page shows.
+def bump_shop(shop_id):
+    Shop.query.filter_by(shop_id=shop_id) \
+        .update({'revision': Shop.revision + 1, 'updated_at': datetime.utcnow()},
+                synchronize_session=False)
+    # Lets after-commit listeners (e.g. snapshot.py) see that a listing changed
+    db.session.info['items_written'] = True
@@ -0,0 +1,85 @@
+import os
+import re
+import importlib.util
+from flask import url_for
+
+# Pillow is optional (without it uploads are stored untouched) and is only
+# imported where images are decoded: the worker processes, not web workers.
+_HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+# Widths (px) generated for every upload. The widest one is what img_url points at.
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# Matches img_url values written by build_derivatives, e.g. 'products/3f2a9c-640.jpg'
+_DERIVATIVE_RE = re.compile(r'^(?P<stem>.+)-(?P<width>\d+)\.jpg$')
+
+
+def pipeline_available():
+    return _HAS_PILLOW
+
+
+def derivative_name(stem, width, ext):
+    return f'{stem}-{width}.{ext}'
+
+
+def _flatten(im):
+    """Convert any mode (RGBA, P, LA, CMYK...) to RGB, compositing alpha onto white."""
+    from PIL import Image
+    if im.mode == 'RGB':
+        return im
+    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
+        im = im.convert('RGBA')
+        background = Image.new('RGB', im.size, (255, 255, 255))
+        background.paste(im, mask=im.getchannel('A'))
+        return background
+    return im.convert('RGB')
+
+
+def target_widths(original_width, widths=DERIVATIVE_WIDTHS):
+    """Widths actually produced for an image: never upscale, always at least one."""
+    produced = {w for w in widths if w < original_width}
+    produced.add(min(original_width, max(widths)))
+    return sorted(produced)
+
+
+def build_derivatives(source, dest_dir, stem, widths=DERIVATIVE_WIDTHS):
+    """
+    Decode `source` (path or file object) once and write a WebP and a JPEG copy
+    per target width into dest_dir. Metadata (EXIF, GPS, ICC comments) is not
+    carried over. Returns the filename of the widest JPEG.
+    """
+    from PIL import Image, ImageOps
+    os.makedirs(dest_dir, exist_ok=True)
+    with Image.open(source) as im:
+        # Let the JPEG decoder downscale by a power of two while decoding.
+        im.draft('RGB', (max(widths), max(widths)))
+        im = _flatten(ImageOps.exif_transpose(im))
+
+        largest = None
+        for width in target_widths(im.width, widths):
+            height = max(1, round(im.height * width / im.width))
+            resized = im if width == im.width else im.resize((width, height), Image.LANCZOS)
+            resized.save(os.path.join(dest_dir, derivative_name(stem, width, 'webp')),
+                         'WEBP', quality=WEBP_QUALITY, method=4)
+            largest = derivative_name(stem, width, 'jpg')
+            resized.save(os.path.join(dest_dir, largest),
+                         'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return largest
+
+
+def image_srcset(img_url, ext='jpg'):
+    """
+    Build a srcset string for an img_url produced by the pipeline. Derivative
+    widths are implied by the filename, so no filesystem access is needed.
+    Returns '' for legacy images that have no derivatives.
+    """
+    match = _DERIVATIVE_RE.match(img_url or '')
+    if not match:
+        return ''
+    stem, widest = match.group('stem'), int(match.group('width'))
+    widths = [w for w in DERIVATIVE_WIDTHS if w < widest] + [widest]
+    return ', '.join(
+        f"{url_for('static', filename=derivative_name(stem, w, ext))} {w}w" for w in widths
+    )
@@ -0,0 +1,190 @@
+import hmac
+import json
+import time
+import logging
+import threading
+from flask import g, request, has_app_context, current_app, Response, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_log = logging.getLogger('web_app.slow_requests')
+
+# Histogram bucket upper bounds, in seconds (Prometheus convention)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --- SQL timing (all engines) ---
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_sql(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._perf_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_sql(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_perf_start', None)
+    if started is not None and has_app_context():
+        perf = g.get('_perf')
+        if perf is not None:
+            perf['sql'].append((time.perf_counter() - started, statement))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+
+
+class MetricsStore:
+    """One app's request counters, histograms and gauge callables."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}     # (endpoint, metric) -> Histogram
+        self.requests = {}   # (endpoint, method, status) -> count
+        self.gauges = []     # callables returning {name: value}
+
+
+class RequestMetrics:
+    """
+    Per-request wall time, SQL count/time and template render time, reported
+    as a Server-Timing header, a structured slow-request log line and
+    Prometheus text at /metrics. Figures are per process and per app, kept
+    in app.extensions['request_metrics'].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        app.config.setdefault('SLOW_REQUEST_MAX_STATEMENTS', 10)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._template_start, app)
+        template_rendered.connect(self._template_end, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['request_metrics'] = MetricsStore()
+
+    def add_gauges(self, app, collect):
+        """Register a callable returning {metric_name: value} for app's /metrics."""
+        gauges = app.extensions['request_metrics'].gauges
+        if collect not in gauges:
+            gauges.append(collect)
+
+    # --- per request ---
+    def _start(self):
+        g._perf = {'start': time.perf_counter(), 'sql': [], 'tpl': 0.0, 'tpl_stack': []}
+
+    def _template_start(self, sender, template, context, **extra):
+        perf = g.get('_perf')
+        if perf is not None:
+            perf['tpl_stack'].append(time.perf_counter())
+
+    def _template_end(self, sender, template, context, **extra):
+        perf = g.get('_perf')
+        if perf is not None and perf['tpl_stack']:
+            started = perf['tpl_stack'].pop()
+            if not perf['tpl_stack']:  # nested renders (fragments) are inside the outer one
+                perf['tpl'] += time.perf_counter() - started
+
+    def _finish(self, response):
+        perf = g.pop('_perf', None)
+        if perf is None:
+            return response
+        total = time.perf_counter() - perf['start']
+        db_time = sum(duration for duration, _ in perf['sql'])
+        endpoint = request.endpoint or 'unmatched'
+
+        response.headers.add('Server-Timing', (
+            f'db;dur={db_time * 1000:.1f};desc="{len(perf["sql"])} queries", '
+            f'tpl;dur={perf["tpl"] * 1000:.1f}, '
+            f'total;dur={total * 1000:.1f}'))
+
+        store = current_app.extensions['request_metrics']
+        with store.lock:
+            for metric, value in (('duration', total), ('db', db_time), ('template', perf['tpl'])):
+                store.series.setdefault((endpoint, metric), Histogram()).observe(value)
+            store.series.setdefault((endpoint, 'queries'), Histogram()).total += len(perf['sql'])
+            key = (endpoint, request.method, response.status_code)
+            store.requests[key] = store.requests.get(key, 0) + 1
+
+        if total * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+            slowest = sorted(perf['sql'], key=lambda s: s[0], reverse=True)
+            slow_log.warning(json.dumps({
+                'event': 'slow_request',
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'db_ms': round(db_time * 1000, 1),
+                'template_ms': round(perf['tpl'] * 1000, 1),
+                'queries': len(perf['sql']),
+                'slowest_statements': [
+                    {'ms': round(d * 1000, 2), 'sql': ' '.join(sql.split())}
+                    for d, sql in slowest[:current_app.config['SLOW_REQUEST_MAX_STATEMENTS']]],
+            }))
+        return response
+
+    # --- exposition ---
+    def metrics_view(self):
+        # Same data as the admin-only job pages: without a token, nobody gets it
+        token = current_app.config['METRICS_TOKEN']
+        if not token:
+            abort(403)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self):
+        lines = []
+        names = {'duration': 'http_request_duration_seconds',
+                 'db': 'http_request_db_seconds',
+                 'template': 'http_request_template_seconds'}
+        store = current_app.extensions['request_metrics']
+        with store.lock:
+            series = {k: (list(h.counts), h.total) for k, h in store.series.items()}
+            requests = dict(store.requests)
+
+        lines.append('# TYPE http_requests_total counter')
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        for metric, name in names.items():
+            lines.append(f'# TYPE {name} histogram')
+            for (endpoint, m), (counts, total) in sorted(series.items()):
+                if m != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {total:.6f}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {cumulative}')
+
+        lines.append('# TYPE http_request_queries_total counter')
+        for (endpoint, m), (_, total) in sorted(series.items()):
+            if m == 'queries':
+                lines.append(f'http_request_queries_total{{endpoint="{endpoint}"}} {int(total)}')
+
+        for collect in store.gauges:
+            for name, value in collect().items():
+                if value is not None:
+                    lines.append(f'# TYPE {name} gauge')
+                    lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
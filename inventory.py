@@ -0,0 +1,98 @@
+from collections import defaultdict
+from sqlalchemy import update, case
+from models import db, Item
+from stats import apply_delta
+from fragments import bump_shop
+
+items = Item.__table__
+
+
+class InsufficientStock(Exception):
+    """Some items could not be reserved; `item_ids` lists them."""
+
+    def __init__(self, item_ids):
+        super().__init__(f'insufficient stock for items {sorted(item_ids)}')
+        self.item_ids = item_ids
+
+
+def reserve_stock(item_id, quantity):
+    """
+    Take `quantity` units of an item if, and only if, that many are in stock:
+
+        UPDATE items SET stock = stock - :n, revision = revision + 1
+         WHERE item_id = :id AND stock >= :n
+
+    The check and the decrement are one statement, so concurrent reservations
+    can never oversell or lose each other's writes, and no row is read or
+    locked beforehand. Returns True if the units were reserved. Runs in the
+    caller's transaction; the caller commits.
+    """
+    if quantity <= 0:
+        raise ValueError('quantity must be positive')
+    row = db.session.execute(
+        update(items)
+        .where(items.c.item_id == item_id, items.c.stock >= quantity)
+        .values(stock=items.c.stock - quantity, revision=items.c.revision + 1)
+        .returning(items.c.shop_id, items.c.price)
+    ).first()
+    if row is None:
+        return False
+    shop_id, price = row
+    apply_delta(shop_id, 0, -quantity, -price * quantity)
+    bump_shop(shop_id)
+    return True
+
+
+def release_stock(item_id, quantity):
+    """Return previously reserved units (cancelled order, expired cart). Caller commits."""
+    if quantity <= 0:
+        raise ValueError('quantity must be positive')
+    row = db.session.execute(
+        update(items)
+        .where(items.c.item_id == item_id)
+        .values(stock=items.c.stock + quantity, revision=items.c.revision + 1)
+        .returning(items.c.shop_id, items.c.price)
+    ).first()
+    if row is None:
+        return False
+    shop_id, price = row
+    apply_delta(shop_id, 0, quantity, price * quantity)
+    bump_shop(shop_id)
+    return True
+
+
+def reserve_many(quantities):
+    """
+    Reserve several items at once, all or nothing. `quantities` maps
+    item_id -> units. One set-based statement covers every line:
+
+        UPDATE items SET stock = stock - CASE item_id WHEN .. THEN .. END, ...
+         WHERE item_id IN (..) AND stock >= CASE item_id WHEN .. THEN .. END
+
+    Each row's check-and-decrement is atomic as in reserve_stock. Returns
+    {item_id: (shop_id, unit price)}. If any line is short, raises
+    InsufficientStock; the other lines were already decremented, so the
+    caller must roll back. Otherwise the caller commits.
+    """
+    if not quantities or any(q <= 0 for q in quantities.values()):
+        raise ValueError('quantities must be positive')
+    wanted = case(quantities, value=items.c.item_id)
+    rows = db.session.execute(
+        update(items)
+        .where(items.c.item_id.in_(list(quantities)), items.c.stock >= wanted)
+        .values(stock=items.c.stock - wanted, revision=items.c.revision + 1)
+        .returning(items.c.item_id, items.c.shop_id, items.c.price)
+    ).all()
+    reserved = {item_id: (shop_id, price) for item_id, shop_id, price in rows}
+    if len(reserved) < len(quantities):
+        raise InsufficientStock(set(quantities) - set(reserved))
+
+    # One summary update and one revision bump per shop, not per line
+    per_shop = defaultdict(lambda: [0, 0.0])
+    for item_id, (shop_id, price) in reserved.items():
+        per_shop[shop_id][0] += quantities[item_id]
+        per_shop[shop_id][1] += price * quantities[item_id]
+    for shop_id, (units, value) in per_shop.items():
+        apply_delta(shop_id, 0, -units, -value)
+        bump_shop(shop_id)
+    return reserved
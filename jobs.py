@@ -0,0 +1,245 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from models import db, ImageJob, Item, User
+from images import build_derivatives
+from fragments import bump_shop
+from storage import stage_upload, find_blob, blob_key, acquire, release, point_to, collect_garbage
+
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0                       # seconds between queue scans when idle
+JOB_LEASE = timedelta(minutes=5)          # a 'running' job older than this is assumed lost
+KEEP_FINISHED = timedelta(days=7)
+HOUSEKEEPING_INTERVAL = timedelta(minutes=1)
+
+# kind -> (model, url column, status column or None, static sub-folder)
+TARGETS = {
+    'item': (Item, 'img_url', 'img_status', 'products'),
+    'profile': (User, 'profile_img_url', None, 'artisans'),
+}
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class Dispatcher:
+    """One app's dispatcher thread, process pool and counters."""
+
+    def __init__(self, app):
+        self.app = app
+        self._executor = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._last_housekeeping = datetime.min
+        self.counters = {'completed': 0, 'retried': 0, 'failed': 0}
+
+    def kick(self):
+        self._ensure_started()
+        self._wake.set()
+
+    # --- consumer side (dispatcher thread) ---
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.app.config['IMAGE_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            self._thread = threading.Thread(target=self._run, name='image-worker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        in_flight = {}
+        while True:
+            with self.app.app_context():
+                try:
+                    self._housekeeping()
+                    while len(in_flight) < self.app.config['IMAGE_WORKERS']:
+                        job = self._claim()
+                        if job is None:
+                            break
+                        folder = os.path.join(self.app.root_path, 'static', TARGETS[job.kind][3])
+                        future = self._executor.submit(build_derivatives, job.source_path,
+                                                       folder, job.digest)
+                        in_flight[future] = job.id
+
+                    if in_flight:
+                        done, _ = wait(in_flight, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._finish(in_flight.pop(future), future)
+                except Exception:
+                    # Keep the dispatcher alive; unfinished jobs are retried via their lease.
+                    db.session.rollback()
+                    self.app.logger.exception('Image worker iteration failed')
+                finally:
+                    db.session.remove()
+
+            if not in_flight:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        job = (ImageJob.query
+               .filter(ImageJob.status == 'queued', ImageJob.run_after <= now)
+               .order_by(ImageJob.id)
+               .first())
+        if job is None:
+            return None
+        # Conditional update so two processes never run the same job.
+        claimed = (ImageJob.query
+                   .filter_by(id=job.id, status='queued')
+                   .update({'status': 'running', 'started_at': now,
+                            'attempts': ImageJob.attempts + 1}, synchronize_session=False))
+        db.session.commit()
+        if not claimed:
+            return self._claim()
+        db.session.refresh(job)
+        return job
+
+    def _finish(self, job_id, future):
+        job = db.session.get(ImageJob, job_id)
+        model, url_attr, status_attr, folder = TARGETS[job.kind]
+        target = db.session.get(model, job.target_id)
+        error = future.exception()
+
+        if error is None:
+            url = f'{folder}/{future.result()}'
+            key = blob_key(folder, job.digest)
+            if target is not None:
+                point_to(target, url_attr, key, url)
+                if status_attr:
+                    setattr(target, status_attr, 'ready')
+                if job.kind == 'item':
+                    bump_shop(target.shop_id)  # item revision is bumped by the ORM flush
+            else:
+                # Target was deleted meanwhile: register the files unreferenced so GC removes them.
+                acquire(key, url)
+                release(url)
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            self.counters['completed'] += 1
+            self._discard_source(job)
+        elif job.attempts < MAX_ATTEMPTS:
+            job.status = 'queued'
+            job.last_error = repr(error)
+            job.run_after = datetime.utcnow() + timedelta(seconds=2 ** job.attempts)
+            self.counters['retried'] += 1
+        else:
+            job.status = 'failed'
+            job.last_error = repr(error)
+            job.finished_at = datetime.utcnow()
+            if target is not None and status_attr:
+                setattr(target, status_attr, 'failed')
+                bump_shop(target.shop_id)
+            self.counters['failed'] += 1
+            self._discard_source(job)
+        db.session.commit()
+        collect_garbage()
+
+    def _housekeeping(self):
+        now = datetime.utcnow()
+        if now - self._last_housekeeping < HOUSEKEEPING_INTERVAL:
+            return
+        self._last_housekeeping = now
+        ImageJob.query.filter(ImageJob.status == 'running',
+                              ImageJob.started_at < now - JOB_LEASE) \
+            .update({'status': 'queued'}, synchronize_session=False)
+        ImageJob.query.filter(ImageJob.status == 'done',
+                              ImageJob.finished_at < now - KEEP_FINISHED) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def _discard_source(job):
+        try:
+            os.remove(job.source_path)
+        except OSError:
+            pass
+
+
+class ImageWorker:
+    """
+    Local job queue for upload processing. Jobs are rows in `image_jobs` (same
+    database as everything else), so they survive restarts and can be claimed
+    by any app process. A dispatcher thread claims jobs and runs the CPU-heavy
+    resizing in a process pool, keeping request threads free. Each app gets
+    its own Dispatcher in app.extensions['image_worker'].
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_WORKERS', 2)
+        app.config.setdefault('IMAGE_STAGING_FOLDER', os.path.join(app.instance_path, 'uploads'))
+        app.extensions['image_worker'] = Dispatcher(app)
+
+    @staticmethod
+    def _dispatcher():
+        return current_app.extensions['image_worker']
+
+    # --- producer side (request thread) ---
+    def submit(self, target, form_picture):
+        """
+        Stage the raw upload and add a job for `target` (an Item or User) to the
+        current session. Nothing is decoded here; the caller commits as usual
+        and then calls kick(). Content that was processed before is reused
+        straight away without a job.
+        """
+        kind = 'item' if isinstance(target, Item) else 'profile'
+        _, url_attr, status_attr, folder = TARGETS[kind]
+        digest, source_path = stage_upload(form_picture, current_app.config['IMAGE_STAGING_FOLDER'])
+
+        blob = find_blob(blob_key(folder, digest))
+        if blob is not None:
+            os.remove(source_path)
+            point_to(target, url_attr, blob.key, blob.url)
+            return
+
+        db.session.flush()  # make sure the target has a primary key
+        if status_attr:
+            setattr(target, status_attr, 'processing')
+        target_id = target.item_id if kind == 'item' else target.user_id
+        db.session.add(ImageJob(kind=kind, target_id=target_id, digest=digest, source_path=source_path))
+
+    def kick(self):
+        self._dispatcher().kick()
+
+    # --- metrics ---
+    def stats(self):
+        """Queue depth and latency figures (seconds) for monitoring."""
+        now = datetime.utcnow()
+        depth = dict(db.session.query(ImageJob.status, func.count(ImageJob.id))
+                     .group_by(ImageJob.status).all())
+        oldest_queued = (db.session.query(func.min(ImageJob.created_at))
+                         .filter(ImageJob.status == 'queued').scalar())
+        recent = (db.session.query(ImageJob.created_at, ImageJob.started_at, ImageJob.finished_at)
+                  .filter(ImageJob.status == 'done')
+                  .order_by(ImageJob.finished_at.desc())
+                  .limit(200).all())
+        wait_times = [(s - c).total_seconds() for c, s, _ in recent]
+        total_times = [(f - c).total_seconds() for c, _, f in recent]
+        return {
+            'depth': {status: depth.get(status, 0) for status in ('queued', 'running', 'failed', 'done')},
+            'oldest_queued_age': (now - oldest_queued).total_seconds() if oldest_queued else 0,
+            'wait_p50': _percentile(wait_times, 50),
+            'wait_p95': _percentile(wait_times, 95),
+            'latency_p50': _percentile(total_times, 50),
+            'latency_p95': _percentile(total_times, 95),
+            'counters': dict(self._dispatcher().counters),
+        }
+
+
+image_worker = ImageWorker()
@@ -0,0 +1,200 @@
+"""
+Static file and product media serving, selected with MEDIA_SERVE_MODE:
+
+    'flask'       Flask's own static view (the default; fine for development).
+    'sendfile'    Served by the app, but the body is handed to the WSGI server's
+                  wsgi.file_wrapper. Servers such as gunicorn turn that into
+                  os.sendfile(), so bytes go from the page cache to the socket
+                  without passing through Python. Single byte ranges keep that
+                  path: the file is positioned at the range start and
+                  Content-Length bounds the copy.
+    'x-accel'     Behind nginx: reply with an empty body and X-Accel-Redirect,
+                  and nginx streams the file (ranges included). Needs an
+                  internal location matching MEDIA_ACCEL_PREFIX, e.g.
+
+                      location /_static/ { internal; alias /srv/web_app/static/; }
+
+                  Let nginx pick precompressed variants (gzip_static/brotli_static).
+    'x-sendfile'  Behind Apache mod_xsendfile or lighttpd: the X-Sendfile header
+                  carries the absolute path, percent-encoded (mod_xsendfile's
+                  XSendFileUnescape, on by default, decodes it).
+
+Header values must be latin-1 under PEP 3333 and nginx expects a URI, so
+both redirect headers carry the path percent-encoded; names such as
+'artisans/Zoë’s.png' then survive the trip.
+
+In the 'sendfile' and 'x-sendfile' modes, a request for a text asset
+(CSS/JS/SVG) from a client that accepts it is answered with a precompressed
+.br or .gz sibling when one exists and is up to date (see `flask
+compress-static`). The 'flask' mode keeps the stock static view, which
+serves the files as they are.
+"""
+import os
+import gzip
+import shutil
+import mimetypes
+from urllib.parse import quote
+from flask import request, current_app, abort, Response
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError:  # optional; without it only .gz variants are built
+    brotli = None
+
+MODES = ('flask', 'sendfile', 'x-accel', 'x-sendfile')
+PRECOMPRESSED_TYPES = ('.css', '.js', '.svg')
+# Preference order when the client accepts several encodings
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+BLOCK_SIZE = 64 * 1024
+
+
+class MediaServer:
+    """Replaces the view behind the 'static' endpoint according to MEDIA_SERVE_MODE."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MEDIA_SERVE_MODE', 'flask')
+        app.config.setdefault('MEDIA_ACCEL_PREFIX', '/_static/')
+        mode = app.config['MEDIA_SERVE_MODE']
+        if mode not in MODES:
+            raise RuntimeError(f'MEDIA_SERVE_MODE must be one of {MODES}, not {mode!r}')
+        app.extensions['media_server'] = self
+        if mode != 'flask':
+            # url_for('static', ...) and the fingerprint/Cache-Control hooks keep working
+            app.view_functions['static'] = self.serve_static
+
+    # --- selection ---
+    def _precompressed(self, path):
+        """(path, encoding) of the best precompressed variant the client accepts."""
+        if not path.endswith(PRECOMPRESSED_TYPES):
+            return path, None
+        mtime = os.path.getmtime(path)
+        for encoding, suffix in ENCODINGS:
+            if encoding in request.accept_encodings:
+                try:
+                    if os.path.getmtime(path + suffix) >= mtime:
+                        return path + suffix, encoding
+                except OSError:
+                    continue
+        return path, None
+
+    def serve_static(self, filename):
+        static_folder = current_app.static_folder
+        path = safe_join(static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mode = current_app.config['MEDIA_SERVE_MODE']
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if mode == 'x-accel':
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = \
+                current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/') + '/' + quote(filename)
+            return response
+
+        served, encoding = self._precompressed(path)
+        stat = os.stat(served)
+        etag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}-{encoding or "identity"}'
+
+        # Validators first: a revalidation ends with a 304 before any file is opened
+        response = Response(mimetype=mimetype)
+        if encoding:
+            response.content_encoding = encoding
+        if path.endswith(PRECOMPRESSED_TYPES):
+            response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.last_modified = int(stat.st_mtime)
+        max_age = current_app.get_send_file_max_age(filename)
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+        if mode == 'x-sendfile':
+            response.headers['X-Sendfile'] = quote(os.path.abspath(served))
+            response.content_length = stat.st_size
+        else:
+            self._attach_file(response, served, stat.st_size, etag, stat.st_mtime)
+        return response
+
+    def _attach_file(self, response, path, size, etag, mtime):
+        """
+        Make the body the open file itself (200, or 206 for a single range),
+        so the server's wsgi.file_wrapper can sendfile() it. Multi-range
+        requests get the whole file.
+        """
+        start, length = 0, size
+        byte_range = request.range
+        if byte_range is not None and len(byte_range.ranges) == 1 \
+                and self._if_range_ok(etag, mtime):
+            bounds = byte_range.range_for_length(size)
+            if bounds is None:
+                response = Response(status=416)
+                response.headers['Content-Range'] = f'bytes */{size}'
+                abort(response)
+            start, stop = bounds
+            length = stop - start
+            response.status_code = 206
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+
+        fh = open(path, 'rb')
+        fh.seek(start)
+        response.response = wrap_file(request.environ, fh, BLOCK_SIZE)
+        response.direct_passthrough = True
+        response.content_length = length
+        response.accept_ranges = 'bytes'
+
+    def _if_range_ok(self, etag, mtime):
+        """A Range with If-Range applies only if the validator still matches."""
+        if_range = request.if_range
+        if if_range.etag is not None:
+            return if_range.etag == etag
+        if if_range.date is not None:
+            return int(mtime) <= if_range.date.timestamp()
+        return True
+
+
+media_server = MediaServer()
+
+
+def compress_static(static_folder, force=False):
+    """
+    Write .gz (and .br, if the brotli package is installed) siblings for every
+    CSS/JS/SVG file under static_folder. Returns the number of files written.
+    """
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESSED_TYPES):
+                continue
+            path = os.path.join(root, name)
+            mtime = os.path.getmtime(path)
+            targets = [('.gz', _gzip)]
+            if brotli is not None:
+                targets.append(('.br', _brotli))
+            for suffix, write in targets:
+                out = path + suffix
+                if not force and os.path.exists(out) and os.path.getmtime(out) >= mtime:
+                    continue
+                write(path, out)
+                written += 1
+    return written
+
+
+def _gzip(src, dst):
+    with open(src, 'rb') as fin, gzip.open(dst, 'wb', compresslevel=9) as fout:
+        shutil.copyfileobj(fin, fout)
+
+
+def _brotli(src, dst):
+    with open(src, 'rb') as fin:
+        data = brotli.compress(fin.read(), quality=11)
+    with open(dst, 'wb') as fout:
+        fout.write(data)
@@ -0,0 +1,36 @@
+"""catalogue price indexes
+
+Keyset indexes for the public catalogue's price-sorted listings, with and
+without a category facet.
+
+Revision ID: 3b3552afac96
+Revises: 5702615a2a09
+Create Date: 2026-10-18 09:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b3552afac96'
+down_revision = '5702615a2a09'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_items_category_price_item', ['category_id', 'price', 'item_id']),
+    ('ix_items_price_item', ['price', 'item_id']),
+)
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('items')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'items', columns)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='items')
@@ -0,0 +1,30 @@
+"""widen users.password_hash
+
+scrypt and argon2 hashes run past the old 150-character limit.
+
+Revision ID: 5702615a2a09
+Revises: 80d5f1ef3d66
+Create Date: 2026-10-18 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5702615a2a09'
+down_revision = '80d5f1ef3d66'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=150),
+                              type_=sa.String(length=255), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=255),
+                              type_=sa.String(length=150), existing_nullable=False)
@@ -0,0 +1,65 @@
+"""carts and orders
+
+Revision ID: 7b9951d193c7
+Revises: d15206a469aa
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b9951d193c7'
+down_revision = 'd15206a469aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'cart_lines' not in tables:
+        op.create_table('cart_lines',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('added_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['item_id'], ['items.item_id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+            sa.PrimaryKeyConstraint('user_id', 'item_id'),
+        )
+
+    if 'orders' not in tables:
+        op.create_table('orders',
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total', sa.Float(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+            sa.PrimaryKeyConstraint('order_id'),
+        )
+        op.create_index('ix_orders_user_id', 'orders', ['user_id'])
+
+    if 'order_lines' not in tables:
+        op.create_table('order_lines',
+            sa.Column('order_id', sa.Integer(), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('shop_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('unit_price', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['item_id'], ['items.item_id']),
+            sa.ForeignKeyConstraint(['order_id'], ['orders.order_id']),
+            sa.ForeignKeyConstraint(['shop_id'], ['shops.shop_id']),
+            sa.PrimaryKeyConstraint('order_id', 'item_id'),
+        )
+        op.create_index('ix_order_lines_shop_id', 'order_lines', ['shop_id'])
+
+
+def downgrade():
+    op.drop_index('ix_order_lines_shop_id', table_name='order_lines')
+    op.drop_table('order_lines')
+    op.drop_index('ix_orders_user_id', table_name='orders')
+    op.drop_table('orders')
+    op.drop_table('cart_lines')
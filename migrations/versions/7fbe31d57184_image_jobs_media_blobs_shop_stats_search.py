@@ -0,0 +1,136 @@
+"""image jobs, media blobs, shop stats, keyset indexes and the FTS5 index
+
+Everything the schema gained before migrations existed: background image
+jobs and img_status, the content-addressed media store, per-shop dashboard
+totals (backfilled here), the keyset pagination indexes and, on SQLite, the
+items_fts full-text index with its sync triggers (populated here). Anything
+an earlier create_all() already made is left alone.
+
+Revision ID: 7fbe31d57184
+Revises: cb359aac6694
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7fbe31d57184'
+down_revision = 'cb359aac6694'
+branch_labels = None
+depends_on = None
+
+# Same statements as search.py; frozen here so later edits there don't rewrite history
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+           name, description, category,
+           tokenize = 'unicode61 remove_diacritics 2',
+           prefix = '2 3'
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+           INSERT INTO items_fts (rowid, name, description, category)
+           VALUES (new.item_id, new.name, coalesce(new.description, ''),
+                   (SELECT name FROM category WHERE id = new.category_id));
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+           DELETE FROM items_fts WHERE rowid = old.item_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, description, category_id ON items BEGIN
+           UPDATE items_fts
+              SET name = new.name,
+                  description = coalesce(new.description, ''),
+                  category = (SELECT name FROM category WHERE id = new.category_id)
+            WHERE rowid = new.item_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS category_fts_au AFTER UPDATE OF name ON category BEGIN
+           UPDATE items_fts SET category = new.name
+            WHERE rowid IN (SELECT item_id FROM items WHERE category_id = new.id);
+       END""",
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'img_status' not in {c['name'] for c in inspector.get_columns('items')}:
+        op.add_column('items', sa.Column('img_status', sa.String(length=20), nullable=False,
+                                         server_default='ready'))
+    item_indexes = {i['name'] for i in inspector.get_indexes('items')}
+    if 'ix_items_shop_item' not in item_indexes:
+        op.create_index('ix_items_shop_item', 'items', ['shop_id', 'item_id'])
+    if 'ix_items_shop_price_item' not in item_indexes:
+        op.create_index('ix_items_shop_price_item', 'items', ['shop_id', 'price', 'item_id'])
+
+    if 'image_jobs' not in tables:
+        op.create_table(
+            'image_jobs',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('target_id', sa.Integer(), nullable=False),
+            sa.Column('source_path', sa.String(length=500), nullable=False),
+            sa.Column('digest', sa.String(length=64), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('run_after', sa.DateTime(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_image_jobs_status', 'image_jobs', ['status'])
+
+    if 'media_blobs' not in tables:
+        op.create_table(
+            'media_blobs',
+            sa.Column('key', sa.String(length=100), nullable=False),
+            sa.Column('url', sa.String(length=250), nullable=False),
+            sa.Column('ref_count', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('key'),
+            sa.UniqueConstraint('url'),
+        )
+
+    if 'shop_stats' not in tables:
+        op.create_table(
+            'shop_stats',
+            sa.Column('shop_id', sa.Integer(), nullable=False),
+            sa.Column('item_count', sa.Integer(), nullable=False),
+            sa.Column('total_stock', sa.Integer(), nullable=False),
+            sa.Column('total_value', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['shop_id'], ['shops.shop_id']),
+            sa.PrimaryKeyConstraint('shop_id'),
+        )
+        op.execute("""
+            INSERT INTO shop_stats (shop_id, item_count, total_stock, total_value)
+            SELECT s.shop_id, COUNT(i.item_id), COALESCE(SUM(i.stock), 0),
+                   COALESCE(SUM(i.price * COALESCE(i.stock, 0)), 0.0)
+              FROM shops s LEFT JOIN items i ON i.shop_id = s.shop_id
+             GROUP BY s.shop_id
+        """)
+
+    if op.get_bind().dialect.name == 'sqlite' and 'items_fts' not in tables:
+        for statement in FTS_DDL:
+            op.execute(statement)
+        op.execute("""
+            INSERT INTO items_fts (rowid, name, description, category)
+            SELECT i.item_id, i.name, coalesce(i.description, ''), c.name
+              FROM items i JOIN category c ON c.id = i.category_id
+        """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('category_fts_au', 'items_fts_au', 'items_fts_ad', 'items_fts_ai'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS items_fts')
+    op.drop_table('shop_stats')
+    op.drop_table('media_blobs')
+    op.drop_index('ix_image_jobs_status', table_name='image_jobs')
+    op.drop_table('image_jobs')
+    op.drop_index('ix_items_shop_price_item', table_name='items')
+    op.drop_index('ix_items_shop_item', table_name='items')
+    with op.batch_alter_table('items') as batch_op:
+        batch_op.drop_column('img_status')
@@ -0,0 +1,36 @@
+"""user and shop updated_at
+
+Last-Modified for /dashboard and the shop pages comes from these columns.
+Existing rows are stamped with the migration time.
+
+Revision ID: 80d5f1ef3d66
+Revises: ae4d721dd01a
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '80d5f1ef3d66'
+down_revision = 'ae4d721dd01a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in ('users', 'shops'):
+        if 'updated_at' in {c['name'] for c in inspector.get_columns(table)}:
+            continue
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = CURRENT_TIMESTAMP')
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    for table in ('shops', 'users'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
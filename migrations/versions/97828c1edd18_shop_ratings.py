@@ -0,0 +1,60 @@
+"""shop ratings
+
+Per-user ratings plus running count/sum/score columns on shops, so the
+top-rated listing is an index walk instead of an aggregate.
+
+Revision ID: 97828c1edd18
+Revises: 7b9951d193c7
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '97828c1edd18'
+down_revision = '7b9951d193c7'
+branch_labels = None
+depends_on = None
+
+SHOP_COLUMNS = (
+    ('rating_count', sa.Integer(), '0'),
+    ('rating_sum', sa.Integer(), '0'),
+    ('rating_score', sa.Float(), '3.5'),   # the prior mean: an unrated shop's score
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    columns = {c['name'] for c in inspector.get_columns('shops')}
+    for name, type_, default in SHOP_COLUMNS:
+        if name not in columns:
+            op.add_column('shops', sa.Column(name, type_, nullable=False, server_default=default))
+    # Shops that were never rated score the prior, as after their last rating is removed
+    op.execute('UPDATE shops SET rating_score = 3.5 WHERE rating_count = 0')
+    if 'ix_shops_rating_score_shop' not in {ix['name'] for ix in inspector.get_indexes('shops')}:
+        op.create_index('ix_shops_rating_score_shop', 'shops', ['rating_score', 'shop_id'])
+
+    if 'shop_ratings' not in inspector.get_table_names():
+        op.create_table('shop_ratings',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('shop_id', sa.Integer(), nullable=False),
+            sa.Column('stars', sa.Integer(), nullable=False),
+            sa.Column('rated_at', sa.DateTime(), nullable=False),
+            sa.CheckConstraint('stars BETWEEN 1 AND 5', name='ck_shop_ratings_stars'),
+            sa.ForeignKeyConstraint(['shop_id'], ['shops.shop_id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+            sa.PrimaryKeyConstraint('user_id', 'shop_id'),
+        )
+        op.create_index('ix_shop_ratings_shop_id', 'shop_ratings', ['shop_id'])
+
+
+def downgrade():
+    op.drop_index('ix_shop_ratings_shop_id', table_name='shop_ratings')
+    op.drop_table('shop_ratings')
+    op.drop_index('ix_shops_rating_score_shop', table_name='shops')
+    with op.batch_alter_table('shops') as batch_op:
+        for name, _, _ in reversed(SHOP_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,33 @@
+"""shop and item revision counters
+
+Shop.revision versions page caches and ETags; Item.revision versions cached
+product cards (and is the mapper's version_id_col).
+
+Revision ID: ae4d721dd01a
+Revises: 7fbe31d57184
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ae4d721dd01a'
+down_revision = '7fbe31d57184'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in ('shops', 'items'):
+        if 'revision' not in {c['name'] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('revision', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    # A plain DROP COLUMN (SQLite 3.35+): a batch copy of items would lose
+    # the FTS triggers on it and break category_fts_au mid-rename
+    for table in ('items', 'shops'):
+        op.drop_column(table, 'revision')
@@ -0,0 +1,90 @@
+"""baseline schema: users, addresses, shops, category, items
+
+The tables as they stood before migrations were introduced; databases made
+by create_all() back then are stamped at this revision by `flask init-db`.
+
+Revision ID: cb359aac6694
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb359aac6694'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=150), nullable=False),
+        sa.Column('password_hash', sa.String(length=150), nullable=False),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('first_name', sa.String(length=150), nullable=True),
+        sa.Column('last_name', sa.String(length=150), nullable=True),
+        sa.Column('gender', sa.String(length=50), nullable=True),
+        sa.Column('birthdate', sa.Date(), nullable=True),
+        sa.Column('contact_num', sa.String(length=20), nullable=False),
+        sa.Column('bio', sa.Text(), nullable=True),
+        sa.Column('profile_img_url', sa.String(length=250), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'category',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=300), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_table(
+        'addresses',
+        sa.Column('address_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('street_address', sa.String(length=150), nullable=False),
+        sa.Column('city', sa.String(length=100), nullable=False),
+        sa.Column('province', sa.String(length=100), nullable=False),
+        sa.Column('zip_code', sa.String(length=20), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id']),
+        sa.PrimaryKeyConstraint('address_id'),
+        sa.UniqueConstraint('user_id'),
+    )
+    op.create_table(
+        'shops',
+        sa.Column('shop_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('parent_shop_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.user_id']),
+        sa.ForeignKeyConstraint(['parent_shop_id'], ['shops.shop_id']),
+        sa.PrimaryKeyConstraint('shop_id'),
+    )
+    op.create_table(
+        'items',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=True),
+        sa.Column('img_url', sa.String(length=250), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('shop_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id']),
+        sa.ForeignKeyConstraint(['shop_id'], ['shops.shop_id']),
+        sa.PrimaryKeyConstraint('item_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('items')
+    op.drop_table('shops')
+    op.drop_table('addresses')
+    op.drop_table('category')
+    op.drop_table('users')
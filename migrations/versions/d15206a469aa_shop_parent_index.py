@@ -0,0 +1,28 @@
+"""index shops.parent_shop_id
+
+The shop-hierarchy CTEs walk parent -> children on every step.
+
+Revision ID: d15206a469aa
+Revises: 3b3552afac96
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd15206a469aa'
+down_revision = '3b3552afac96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('shops')}
+    if 'ix_shops_parent_shop_id' not in existing:
+        op.create_index('ix_shops_parent_shop_id', 'shops', ['parent_shop_id'])
+
+
+def downgrade():
+    op.drop_index('ix_shops_parent_shop_id', table_name='shops')
@@ -1,9 +1,38 @@
+import sqlite3
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, select
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import password_hasher
+from replicas import RoutingSession
 
-# Initialize DB here to prevent circular imports
-db = SQLAlchemy()
+# Initialize DB here to prevent circular imports. Reads in GET requests may
+# be routed to a replica (see replicas.py).
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def tune_sqlite(app, engine=None):
+    """
+    Set WAL journaling, synchronous level and busy timeout on every new SQLite
+    connection, so readers don't block the writer and concurrent writers wait
+    instead of failing with "database is locked". No-op for other databases.
+    Applies to the primary engine unless another `engine` is given.
+    """
+    if engine is None:
+        with app.app_context():
+            engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_conn, connection_record):
+        if not isinstance(dbapi_conn, sqlite3.Connection):
+            return
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.close()
 
 # --- NEW ADDRESS TABLE ---
 class Address(db.Model):
@@ -26,7 +55,7 @@ class User(UserMixin, db.Model):
     
     # Auth Data
     username = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(150), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # scrypt/argon2 hashes exceed 150 chars
     is_admin = db.Column(db.Boolean, default=False)
 
     # Profile Data (Address removed and moved to separate table)
@@ -37,6 +66,8 @@ class User(UserMixin, db.Model):
     contact_num = db.Column(db.String(20), nullable=False, default="N/A")
     bio = db.Column(db.Text, nullable=True)
     profile_img_url = db.Column(db.String(250), nullable=True, default='images/default.png')
+    # Last profile change; drives the profile page's ETag/Last-Modified
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
     # Relationships
@@ -52,14 +83,18 @@ class User(UserMixin, db.Model):
         return str(self.user_id)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
 
 class Shop(db.Model):
     __tablename__ = 'shops'
+    # Top-rated listing walks this index in order (see ratings.top_rated)
+    __table_args__ = (
+        db.Index('ix_shops_rating_score_shop', 'rating_score', 'shop_id'),
+    )
     
     shop_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
@@ -68,20 +103,117 @@ class Shop(db.Model):
     # Foreign Key to User
     owner_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
 
-    # Self-Referential Key for Branches/Locations
-    parent_shop_id = db.Column(db.Integer, db.ForeignKey('shops.shop_id'), nullable=True)
+    # Self-Referential Key for Branches/Locations (indexed: each step of a
+    # hierarchy walk looks up children by parent)
+    parent_shop_id = db.Column(db.Integer, db.ForeignKey('shops.shop_id'), nullable=True, index=True)
     
     # Relationship for sub-locations
     sub_locations = db.relationship('Shop', 
                                     backref=db.backref('parent_shop', remote_side=[shop_id]),
                                     lazy=True)
 
+    # Running rating aggregates, maintained by ratings.py in the same statement
+    # as each rating change; rating_score is the Bayesian average used for ranking,
+    # which for an unrated shop is the prior mean (ratings.PRIOR_MEAN)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_score = db.Column(db.Float, nullable=False, default=3.5)
+
+    # Bumped on every change to the shop or its items; versions page caches/ETags
+    revision = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     # One Shop has many items
     items = db.relationship('Item', backref='shop', lazy=True)
 
+    # --- HIERARCHY ---
+    # Branch trees are walked with a recursive CTE, so any depth costs one
+    # query instead of one lazy sub_locations/parent_shop load per level.
+    # UNION (not UNION ALL) drops repeats, so a bad parent cycle still ends.
+    @classmethod
+    def subtree_ids(cls, shop_id):
+        """CTE of shop_id for `shop_id` and every branch below it."""
+        tree = select(cls.shop_id).where(cls.shop_id == shop_id).cte('subtree', recursive=True)
+        return tree.union(select(cls.shop_id).where(cls.parent_shop_id == tree.c.shop_id))
+
+    @classmethod
+    def ancestor_ids(cls, shop_id):
+        """CTE of shop_id for `shop_id` and every shop above it."""
+        chain = select(cls.shop_id, cls.parent_shop_id).where(cls.shop_id == shop_id) \
+            .cte('ancestors', recursive=True)
+        return chain.union(select(cls.shop_id, cls.parent_shop_id)
+                           .where(cls.shop_id == chain.c.parent_shop_id))
+
+    def descendants(self):
+        """All branches below this shop, at any depth."""
+        tree = Shop.subtree_ids(self.shop_id)
+        return (Shop.query.join(tree, Shop.shop_id == tree.c.shop_id)
+                .filter(Shop.shop_id != self.shop_id).all())
+
+    def ancestors(self):
+        """Parent, grandparent, ... up to the root (unordered)."""
+        chain = Shop.ancestor_ids(self.shop_id)
+        return (Shop.query.join(chain, Shop.shop_id == chain.c.shop_id)
+                .filter(Shop.shop_id != self.shop_id).all())
+
+    def subtree_items(self):
+        """Query of items in this shop and all of its branches."""
+        tree = Shop.subtree_ids(self.shop_id)
+        return Item.query.join(tree, Item.shop_id == tree.c.shop_id)
+
+    def subtree_stats(self):
+        """Item count, stock and value rolled up over the whole branch tree, in one query."""
+        tree = Shop.subtree_ids(self.shop_id)
+        count, stock, value = (db.session.query(
+            func.coalesce(func.sum(ShopStats.item_count), 0),
+            func.coalesce(func.sum(ShopStats.total_stock), 0),
+            func.coalesce(func.sum(ShopStats.total_value), 0.0))
+            .join(tree, ShopStats.shop_id == tree.c.shop_id)
+            .one())
+        return {'item_count': count, 'total_stock': stock, 'total_value': value}
+
+    @property
+    def rating_average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+
+# --- SHOP RATINGS ---
+# One rating per user per shop; the aggregates live on Shop (see ratings.py).
+class ShopRating(db.Model):
+    __tablename__ = 'shop_ratings'
+    __table_args__ = (
+        db.CheckConstraint('stars BETWEEN 1 AND 5', name='ck_shop_ratings_stars'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    shop_id = db.Column(db.Integer, db.ForeignKey('shops.shop_id'), primary_key=True, index=True)
+    stars = db.Column(db.Integer, nullable=False)
+    rated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# --- DASHBOARD SUMMARY ---
+# Running per-shop totals, kept in step with items by stats.py so the
+# dashboard is a primary-key lookup instead of aggregates over items.
+class ShopStats(db.Model):
+    __tablename__ = 'shop_stats'
+
+    shop_id = db.Column(db.Integer, db.ForeignKey('shops.shop_id'), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    total_stock = db.Column(db.Integer, nullable=False, default=0)
+    total_value = db.Column(db.Float, nullable=False, default=0.0)   # SUM(price * stock)
+
 
 class Item(db.Model):
     __tablename__ = 'items'
+    # Composite indexes backing keyset pagination (see pagination.py); the
+    # shop_id-leading ones also serve plain lookups by shop. The category and
+    # price ones back the cross-shop catalogue filters (see catalog.py).
+    __table_args__ = (
+        db.Index('ix_items_shop_item', 'shop_id', 'item_id'),
+        db.Index('ix_items_shop_price_item', 'shop_id', 'price', 'item_id'),
+        db.Index('ix_items_category_price_item', 'category_id', 'price', 'item_id'),
+        db.Index('ix_items_price_item', 'price', 'item_id'),
+    )
     
     item_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
@@ -89,11 +221,18 @@ class Item(db.Model):
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, default=0)
     img_url = db.Column(db.String(250), nullable=True)
+    # 'ready' once img_url points at a finished image, 'processing' while an ImageJob runs
+    img_status = db.Column(db.String(20), nullable=False, default='ready')
+    # Bumped on every change to the item; versions its cached card fragment and
+    # guards ORM updates (version_id_col) against lost concurrent writes
+    revision = db.Column(db.Integer, nullable=False, default=1)
 
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     # Foreign Key to Shop
     shop_id = db.Column(db.Integer, db.ForeignKey('shops.shop_id'), nullable=False)
 
+    __mapper_args__ = {'version_id_col': revision}
+
     def __repr__(self):
         return f'<Item {self.name}>'
 
@@ -107,4 +246,82 @@ class Category(db.Model):
     items = db.relationship('Item', backref='category', lazy=True)
 
     def __repr__(self):
-        return f'<Category {self.name}>'
\ No newline at end of file
+        return f'<Category {self.name}>'
+
+
+# --- BACKGROUND IMAGE JOBS ---
+# Durable queue for upload processing; see jobs.py for the worker.
+class ImageJob(db.Model):
+    __tablename__ = 'image_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)        # 'item' or 'profile'
+    target_id = db.Column(db.Integer, nullable=False)      # item_id / user_id
+    source_path = db.Column(db.String(500), nullable=False)
+    digest = db.Column(db.String(64), nullable=False)      # sha256 of the upload, names the output files
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ImageJob {self.id} {self.kind}:{self.target_id} {self.status}>'
+
+
+# --- CONTENT-ADDRESSED IMAGE STORE ---
+# One row per distinct uploaded image; see storage.py.
+class MediaBlob(db.Model):
+    __tablename__ = 'media_blobs'
+
+    key = db.Column(db.String(100), primary_key=True)               # '<folder>/<sha256>'
+    url = db.Column(db.String(250), nullable=False, unique=True)    # value stored in img_url columns
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MediaBlob {self.key} refs={self.ref_count}>'
+
+
+# --- CART & ORDERS ---
+# A cart is just its lines, keyed by (user, item): adding, changing and
+# reading a cart are one statement each (see cart.py).
+class CartLine(db.Model):
+    __tablename__ = 'cart_lines'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.item_id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    added_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CartLine user={self.user_id} item={self.item_id} x{self.quantity}>'
+
+
+class Order(db.Model):
+    __tablename__ = 'orders'
+
+    order_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='placed')
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    lines = db.relationship('OrderLine', backref='order', lazy=True)
+
+    def __repr__(self):
+        return f'<Order {self.order_id} {self.status}>'
+
+
+class OrderLine(db.Model):
+    __tablename__ = 'order_lines'
+
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.order_id'), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.item_id'), primary_key=True)
+    # Denormalized at checkout: the order must not change if the item does
+    shop_id = db.Column(db.Integer, db.ForeignKey('shops.shop_id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
@@ -0,0 +1,67 @@
+import json
+import math
+import base64
+import binascii
+from sqlalchemy import tuple_
+from models import Item
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Sort name -> key columns. The last column must be unique so the order is total;
+# each tuple has a matching (shop_id, ...) index on items.
+SORTS = {
+    'id': (Item.item_id,),
+    'price': (Item.price, Item.item_id),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def decode_cursor(token, size):
+    """
+    The key values of a cursor: `size` finite numbers, the last (item_id) an
+    int. Anything else raises InvalidCursor before it can reach a query.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError) as exc:
+        raise InvalidCursor(token) from exc
+    if not isinstance(values, list) or len(values) != size \
+            or not all(_is_number(value) for value in values) or not isinstance(values[-1], int):
+        raise InvalidCursor(token)
+    return values
+
+
+def keyset_page(query, sort='id', after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (rows, next_cursor) for the page following the `after` cursor.
+    Instead of OFFSET the query seeks past the last key seen, so every page
+    is a bounded index range scan regardless of how deep it is.
+    """
+    columns = SORTS[sort]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if after:
+        values = decode_cursor(after, len(columns))
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+
+    rows = query.order_by(*columns).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], c.key) for c in columns])
@@ -0,0 +1,126 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import argon2
+except ImportError:  # argon2-cffi is optional; only needed for PASSWORD_HASH_SCHEME='argon2'
+    argon2 = None
+
+
+class VerifierBusy(Exception):
+    """Too many password checks are already running or waiting."""
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with parameters taken from config, so the
+    cost can be tuned (or the scheme switched) without touching stored
+    hashes: old hashes keep verifying and are upgraded on the next login.
+
+    Verification runs on a small bounded thread pool (scrypt, PBKDF2 and
+    argon2 all release the GIL) so a burst of logins can occupy at most
+    PASSWORD_VERIFY_WORKERS cores; attempts beyond the waiting room fail
+    fast with VerifierBusy instead of starving every other request.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('PASSWORD_HASH_SCHEME', 'scrypt')
+        config.setdefault('PASSWORD_SCRYPT_N', 32768)
+        config.setdefault('PASSWORD_SCRYPT_R', 8)
+        config.setdefault('PASSWORD_SCRYPT_P', 1)
+        config.setdefault('PASSWORD_PBKDF2_ITERATIONS', 600000)
+        config.setdefault('PASSWORD_ARGON2_TIME_COST', 3)
+        config.setdefault('PASSWORD_ARGON2_MEMORY_COST', 65536)   # KiB
+        config.setdefault('PASSWORD_ARGON2_PARALLELISM', 4)
+        config.setdefault('PASSWORD_VERIFY_WORKERS', 2)
+        config.setdefault('PASSWORD_VERIFY_QUEUE', 16)
+        config.setdefault('PASSWORD_VERIFY_TIMEOUT', 5.0)
+        app.extensions['password_hasher'] = HasherState(config)
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['password_hasher']
+
+    # --- hashing ---
+    def hash(self, password):
+        state = self._state()
+        if state.argon2 is not None:
+            return state.argon2.hash(password)
+        return generate_password_hash(password, method=state.method)
+
+    def verify(self, stored_hash, password):
+        """Check a password against a hash of any supported scheme (inline)."""
+        if stored_hash.startswith('$argon2'):
+            if argon2 is None:
+                return False
+            try:
+                return argon2.PasswordHasher().verify(stored_hash, password)
+            except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+                return False
+        return check_password_hash(stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if the hash was made with a different scheme or cost than configured."""
+        state = self._state()
+        if state.argon2 is not None:
+            return not stored_hash.startswith('$argon2') or state.argon2.check_needs_rehash(stored_hash)
+        return stored_hash.split('$', 1)[0] != state.method
+
+    # --- bounded verification ---
+    def verify_bounded(self, stored_hash, password):
+        """
+        verify() on the worker pool; raises VerifierBusy when saturated. A
+        slot is held until the hash finishes or is cancelled, not until the
+        caller gives up, so timed-out checks still count against the bound.
+        """
+        state = self._state()
+        if not state.slots.acquire(blocking=False):
+            raise VerifierBusy()
+        try:
+            future = state.executor.submit(self.verify, stored_hash, password)
+        except BaseException:
+            state.slots.release()
+            raise
+        future.add_done_callback(lambda _: state.slots.release())
+        try:
+            return future.result(timeout=state.timeout)
+        except FutureTimeout:
+            future.cancel()   # still queued: drop it; already running: it finishes
+            raise VerifierBusy()
+
+
+password_hasher = PasswordHasher()
+
+
+class HasherState:
+    """One app's hashing parameters and verification pool, built from its config."""
+
+    def __init__(self, config):
+        self.argon2 = None
+        self.method = None
+        scheme = config['PASSWORD_HASH_SCHEME']
+        if scheme == 'argon2':
+            if argon2 is None:
+                raise RuntimeError("PASSWORD_HASH_SCHEME='argon2' needs the argon2-cffi package")
+            self.argon2 = argon2.PasswordHasher(
+                time_cost=config['PASSWORD_ARGON2_TIME_COST'],
+                memory_cost=config['PASSWORD_ARGON2_MEMORY_COST'],
+                parallelism=config['PASSWORD_ARGON2_PARALLELISM'],
+            )
+        elif scheme == 'pbkdf2':
+            self.method = f"pbkdf2:sha256:{config['PASSWORD_PBKDF2_ITERATIONS']}"
+        else:
+            self.method = (f"scrypt:{config['PASSWORD_SCRYPT_N']}:"
+                           f"{config['PASSWORD_SCRYPT_R']}:{config['PASSWORD_SCRYPT_P']}")
+
+        workers = config['PASSWORD_VERIFY_WORKERS']
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pw-verify')
+        self.slots = threading.BoundedSemaphore(workers + config['PASSWORD_VERIFY_QUEUE'])
+        self.timeout = config['PASSWORD_VERIFY_TIMEOUT']
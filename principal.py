@@ -0,0 +1,88 @@
+import time
+import threading
+from collections import OrderedDict
+from flask_login import UserMixin
+from sqlalchemy import func
+from models import db, User, Shop
+
+
+class UserPrincipal(UserMixin):
+    """
+    Slim, read-only identity used as `current_user`. Views that need the full
+    profile load the User row explicitly; everything the navbar and the
+    permission checks need is here.
+    """
+
+    def __init__(self, user_id, username, is_admin, shop_id):
+        self.user_id = user_id
+        self.username = username
+        self.is_admin = bool(is_admin)
+        self.shop_id = shop_id
+
+    def get_id(self):
+        return str(self.user_id)
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.username}>'
+
+
+class PrincipalCache:
+    """
+    Thread-safe TTL + LRU cache of UserPrincipal by user id. Entries are
+    dropped explicitly when a user's principal fields change; the TTL bounds
+    staleness across processes, which each hold their own cache.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        principal = loader(user_id)
+        if principal is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, principal)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {'size': size, 'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': self.hits / total if total else None}
+
+
+user_cache = PrincipalCache()
+
+
+def _load_from_db(user_id):
+    row = (db.session.query(User.user_id, User.username, User.is_admin, func.min(Shop.shop_id))
+           .outerjoin(Shop, Shop.owner_id == User.user_id)
+           .filter(User.user_id == user_id)
+           .group_by(User.user_id, User.username, User.is_admin)
+           .first())
+    return UserPrincipal(*row) if row else None
+
+
+def load_principal(user_id):
+    return user_cache.get(int(user_id), _load_from_db)
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, current_app, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view issued more SQL statements than its declared budget."""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        for statements in g.get('_query_counters', ()):
+            statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement run inside the block (app context required)."""
+    statements = []
+    counters = g.setdefault('_query_counters', [])
+    counters.append(statements)
+    try:
+        yield statements
+    finally:
+        counters.remove(statements)
+
+
+def query_budget(limit):
+    """
+    Cap the number of SQL statements a view may run. Over budget, the request
+    fails with QueryBudgetExceeded when QUERY_BUDGET_ENFORCE is on (defaults to
+    app.testing) and is logged as a warning otherwise.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with count_queries() as statements:
+                response = view(*args, **kwargs)
+            if len(statements) > limit:
+                message = (f'{request.endpoint} ran {len(statements)} SQL statements '
+                           f'(budget {limit}):\n' + '\n'.join(statements))
+                if current_app.config.get('QUERY_BUDGET_ENFORCE', current_app.testing):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        return wrapper
+    return decorator
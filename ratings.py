@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy import select, update, delete
+from models import db, Shop, ShopRating
+
+# Bayesian average: every shop starts as if it had PRIOR_WEIGHT ratings of
+# PRIOR_MEAN stars, so one 5-star rating can't outrank a hundred 4.8s.
+PRIOR_MEAN = 3.5
+PRIOR_WEIGHT = 5
+TOP_RATED_LIMIT = 50
+
+shops = Shop.__table__
+ratings = ShopRating.__table__
+
+
+def _apply(shop_id, count_delta, sum_delta):
+    """
+    Adjust a shop's running aggregates and rating_score in one UPDATE. The
+    right-hand sides see the pre-update values, so concurrent changes add
+    up instead of overwriting each other.
+    """
+    count = shops.c.rating_count + count_delta
+    total = shops.c.rating_sum + sum_delta
+    db.session.execute(
+        update(shops).where(shops.c.shop_id == shop_id).values(
+            rating_count=count,
+            rating_sum=total,
+            rating_score=(total + PRIOR_MEAN * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT),
+            revision=shops.c.revision + 1,
+            updated_at=datetime.utcnow(),
+        ))
+
+
+def _take_existing(user_id, shop_id):
+    """Delete the user's rating of the shop, returning its stars (or None)."""
+    return db.session.execute(
+        delete(ratings)
+        .where(ratings.c.user_id == user_id, ratings.c.shop_id == shop_id)
+        .returning(ratings.c.stars)
+    ).scalar()
+
+
+def rate_shop(user_id, shop_id, stars):
+    """
+    Record (or replace) a user's 1-5 star rating of a shop and update the
+    shop's aggregates in the same transaction. The caller commits.
+    """
+    if not 1 <= stars <= 5:
+        raise ValueError('stars must be between 1 and 5')
+    old = _take_existing(user_id, shop_id)
+    db.session.execute(ratings.insert().values(
+        user_id=user_id, shop_id=shop_id, stars=stars, rated_at=datetime.utcnow()))
+    if old is None:
+        _apply(shop_id, 1, stars)
+    elif old != stars:
+        _apply(shop_id, 0, stars - old)
+
+
+def remove_rating(user_id, shop_id):
+    """Withdraw a user's rating; returns False if there was none. The caller commits."""
+    old = _take_existing(user_id, shop_id)
+    if old is None:
+        return False
+    _apply(shop_id, -1, -old)
+    return True
+
+
+def user_rating(user_id, shop_id):
+    return db.session.execute(
+        select(ratings.c.stars).where(ratings.c.user_id == user_id, ratings.c.shop_id == shop_id)
+    ).scalar()
+
+
+def top_rated(limit=TOP_RATED_LIMIT):
+    """
+    Best shops by Bayesian score (an ordered walk of ix_shops_rating_score_shop),
+    then unrated shops, newest first, if fewer than `limit` have ratings.
+    """
+    ranked = (Shop.query
+              .filter(Shop.rating_count > 0)
+              .order_by(Shop.rating_score.desc(), Shop.shop_id.desc())
+              .limit(limit)
+              .all())
+    if len(ranked) < limit:
+        ranked += (Shop.query
+                   .filter(Shop.rating_count == 0)
+                   .order_by(Shop.shop_id.desc())
+                   .limit(limit - len(ranked))
+                   .all())
+    return ranked
+
@@ -0,0 +1,134 @@
+"""
+Read/write routing between the primary database and read replicas.
+
+GET/HEAD requests read from a replica chosen per request. Everything else
+uses the primary: non-GET requests, any session that has flushed or executed
+an INSERT/UPDATE/DELETE, and work outside a request (CLI, image worker).
+After a request commits a write, the client's next reads go to the primary
+for REPLICA_READ_YOUR_WRITES_SECONDS, so users see their own changes even
+while replicas lag.
+
+Replicas come from SQLALCHEMY_REPLICAS. Each entry is a URL, or a dict
+{'url': ..., 'engine_options': {...}} when one engine needs its own pool.
+A second SQLite file works as a local stand-in; `flask sync-replicas` copies
+the primary into it.
+"""
+import os
+import time
+import random
+from flask import g, request, has_request_context, current_app, session as http_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from config import engine_options
+
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+PRIMARY_UNTIL = '_primary_until'
+
+
+class RoutingSession(FlaskSession):
+    """Session whose reads go to the replica picked for the current request."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and not self._flushing \
+                and not getattr(clause, 'is_dml', False) and not self.info.get('wrote'):
+            replica = g.get('db_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+# --- write tracking ---
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executed(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g.db_replica = None   # the rest of this request reads its own write too
+        window = current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+        if window:
+            http_session[PRIMARY_UNTIL] = time.time() + window
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop('wrote', None)
+
+
+class ReplicaRouter:
+    """Creates the replica engines and picks one for each read-only request."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from models import tune_sqlite   # models imports RoutingSession from here
+
+        app.config.setdefault('SQLALCHEMY_REPLICAS', [])
+        app.config.setdefault('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+        engines = []
+        for spec in app.config['SQLALCHEMY_REPLICAS']:
+            url, options = (spec, None) if isinstance(spec, str) else (spec['url'], spec.get('engine_options'))
+            url = _instance_relative(app, url)
+            engine = create_engine(url, **(engine_options(url, prefix='DB_REPLICA') if options is None else options))
+            tune_sqlite(app, engine)
+            engines.append(engine)
+        app.extensions['replicas'] = engines
+        if engines:
+            app.before_request(self._choose)
+
+    def _choose(self):
+        g.db_replica = None
+        if request.method not in READ_METHODS or request.endpoint == 'static':
+            return
+        until = http_session.get(PRIMARY_UNTIL)
+        if until is not None:
+            if until > time.time():
+                return
+            http_session.pop(PRIMARY_UNTIL)
+        g.db_replica = random.choice(current_app.extensions['replicas'])
+
+
+replica_router = ReplicaRouter()
+
+
+def _instance_relative(app, url):
+    """Relative SQLite paths live in the instance folder, as for the primary."""
+    parsed = make_url(url)
+    database = parsed.database
+    if parsed.get_backend_name() == 'sqlite' and database and database != ':memory:' \
+            and not os.path.isabs(database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        parsed = parsed.set(database=os.path.join(app.instance_path, database))
+    return parsed
+
+
+def sync_sqlite_replicas(primary_engine, replicas):
+    """Copy the primary into every SQLite replica (local stand-in only). Returns the count."""
+    copied = 0
+    if primary_engine.dialect.name != 'sqlite':
+        return copied
+    source = primary_engine.raw_connection()
+    try:
+        for engine in replicas:
+            if engine.dialect.name != 'sqlite':
+                continue
+            target = engine.raw_connection()
+            try:
+                source.dbapi_connection.backup(target.dbapi_connection)
+            finally:
+                target.close()
+            copied += 1
+    finally:
+        source.close()
+    return copied
@@ -0,0 +1,132 @@
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, text
+from models import db
+
+# --- FTS5 INDEX (SQLite) ---
+# items_fts holds one row per item (rowid = item_id) with the searchable text,
+# including the category name. Triggers keep it in sync with every write to
+# items/category, ORM or bulk, so no application code has to remember to.
+_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+           name, description, category,
+           tokenize = 'unicode61 remove_diacritics 2',
+           prefix = '2 3'
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+           INSERT INTO items_fts (rowid, name, description, category)
+           VALUES (new.item_id, new.name, coalesce(new.description, ''),
+                   (SELECT name FROM category WHERE id = new.category_id));
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+           DELETE FROM items_fts WHERE rowid = old.item_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, description, category_id ON items BEGIN
+           UPDATE items_fts
+              SET name = new.name,
+                  description = coalesce(new.description, ''),
+                  category = (SELECT name FROM category WHERE id = new.category_id)
+            WHERE rowid = new.item_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS category_fts_au AFTER UPDATE OF name ON category BEGIN
+           UPDATE items_fts SET category = new.name
+            WHERE rowid IN (SELECT item_id FROM items WHERE category_id = new.id);
+       END""",
+]
+
+for _statement in _FTS_DDL:
+    event.listen(db.metadata, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop',
+             DDL('DROP TABLE IF EXISTS items_fts').execute_if(dialect='sqlite'))
+
+
+def rebuild_index():
+    """Repopulate items_fts from scratch (after restoring a backup, etc.)."""
+    db.session.execute(text('DELETE FROM items_fts'))
+    db.session.execute(text("""
+        INSERT INTO items_fts (rowid, name, description, category)
+        SELECT i.item_id, i.name, coalesce(i.description, ''), c.name
+          FROM items i JOIN category c ON c.id = i.category_id
+    """))
+    db.session.commit()
+
+
+# --- QUERYING ---
+MAX_RESULTS = 50
+# Control characters used as highlight markers so item text can be escaped safely.
+_HL_OPEN, _HL_CLOSE = '\x02', '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Column weights for bm25(): name, description, category
+_BM25 = 'bm25(items_fts, 10.0, 1.0, 4.0)'
+
+
+def to_match_query(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(q or ''))
+
+
+def _highlighted(value):
+    """Escape item text and turn the FTS markers into <mark> tags."""
+    return Markup(str(escape(value or ''))
+                  .replace(_HL_OPEN, '<mark>').replace(_HL_CLOSE, '</mark>'))
+
+
+def search_items(q, category=None, min_price=None, max_price=None, limit=20, offset=0):
+    """
+    Ranked search over item name, description and category. Returns a list of
+    dicts with `name_html`/`snippet_html` already escaped and highlighted.
+    """
+    match = to_match_query(q)
+    if not match:
+        return []
+
+    filters, params = [], {'limit': min(limit, MAX_RESULTS), 'offset': offset}
+    if category:
+        filters.append('c.name = :category')
+        params['category'] = category.strip().title()
+    if min_price is not None:
+        filters.append('i.price >= :min_price')
+        params['min_price'] = min_price
+    if max_price is not None:
+        filters.append('i.price <= :max_price')
+        params['max_price'] = max_price
+    where = ''.join(f' AND {f}' for f in filters)
+
+    if db.engine.dialect.name == 'sqlite':
+        params['match'] = match
+        sql = f"""
+            SELECT i.item_id, i.shop_id, i.price, i.stock, i.img_url, c.name AS category,
+                   highlight(items_fts, 0, '{_HL_OPEN}', '{_HL_CLOSE}') AS name_hl,
+                   snippet(items_fts, 1, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 16) AS snippet
+              FROM items_fts
+              JOIN items i ON i.item_id = items_fts.rowid
+              JOIN category c ON c.id = i.category_id
+             WHERE items_fts MATCH :match{where}
+             ORDER BY {_BM25}
+             LIMIT :limit OFFSET :offset"""
+    else:
+        # Other databases have no items_fts; fall back to an unranked substring scan.
+        for n, token in enumerate(_TOKEN_RE.findall(q)):
+            filters.append(f'(i.name ILIKE :t{n} OR i.description ILIKE :t{n} OR c.name ILIKE :t{n})')
+            params[f't{n}'] = f'%{token}%'
+        sql = f"""
+            SELECT i.item_id, i.shop_id, i.price, i.stock, i.img_url, c.name AS category,
+                   i.name AS name_hl, i.description AS snippet
+              FROM items i JOIN category c ON c.id = i.category_id
+             WHERE {' AND '.join(filters)}
+             ORDER BY i.item_id
+             LIMIT :limit OFFSET :offset"""
+
+    rows = db.session.execute(text(sql), params).mappings().all()
+    return [{
+        'item_id': row['item_id'],
+        'shop_id': row['shop_id'],
+        'price': row['price'],
+        'stock': row['stock'],
+        'img_url': row['img_url'],
+        'category': row['category'],
+        'name': (row['name_hl'] or '').replace(_HL_OPEN, '').replace(_HL_CLOSE, ''),
+        'name_html': _highlighted(row['name_hl']),
+        'snippet_html': _highlighted(row['snippet']),
+    } for row in rows]
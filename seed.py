@@ -1,5 +1,10 @@
 # seed.py
-from models import db, User, Shop, Item, Address, Category
+import random
+from models import db, User, Shop, Item, Address, ShopStats
+from categories import category_ids
+from stats import items_added
+from bulk import import_items
+from passwords import password_hasher
 
 def create_default_user():
     user = User.query.filter_by(username='@ziagonzales').first()
@@ -15,7 +20,7 @@ def create_default_user():
         )
         new_user.set_password('admin123')
         db.session.add(new_user)
-        db.session.commit()
+        db.session.flush()
 
         address = Address(
             user_id=new_user.user_id,
@@ -39,6 +44,8 @@ def create_default_shop():
                 owner_id=user.user_id
             )
             db.session.add(new_shop)
+            db.session.flush()
+            db.session.add(ShopStats(shop_id=new_shop.shop_id))
             db.session.commit()
             print("Default Shop Created.")
 
@@ -46,22 +53,9 @@ def create_default_shop():
 def seed_shop_items():
     user = User.query.filter_by(username='@ziagonzales').first()
     
-    # 1. Try to find the category
-    categ = Category.query.filter_by(name='HAND WOOVEN').first()
-
-    if not categ:
-        print("Category 'Home & Living' not found. Creating it...")
-        categ = Category(name='Wooven')
-        db.session.add(categ)
-        db.session.commit() # Commit to ensure it has an ID
-        
-    
-    other = Category.query.filter_by(name='Fashion').first()
-    if not other:
-        other = Category(name='Ceramics')
-        db.session.add(other)
-        db.session.commit()
-    # --- FIX END ---
+    # Both categories in one upsert; re-running finds the existing rows
+    ids = category_ids(['Wooven', 'Ceramics'])
+    categ, other = ids['Wooven'], ids['Ceramics']
 
     if user and user.shops:
         my_shop = user.shops[0]
@@ -75,7 +69,7 @@ def seed_shop_items():
                     description="Crafted from local mahogany.",
                     shop_id=my_shop.shop_id, 
                     stock=10,
-                    category=categ,  # Now guaranteed to exist
+                    category_id=categ,
                     img_url='products/1.1.jpg'
                 ),
                 Item(
@@ -84,7 +78,7 @@ def seed_shop_items():
                     description="Eco-friendly handwoven bag.",
                     shop_id=my_shop.shop_id, 
                     stock=5,
-                    category=other, 
+                    category_id=other,
                     img_url='products/1.2.jpg'
                 ),
                 Item(
@@ -93,7 +87,7 @@ def seed_shop_items():
                     description="Hand-painted ceramic mug.",
                     shop_id=my_shop.shop_id, 
                     stock=20,
-                    category=other, 
+                    category_id=other,
                     img_url='products/1.3.jpg'
                 ),
                 Item(
@@ -102,7 +96,7 @@ def seed_shop_items():
                     description="Hand-painted ceramic mug.",
                     shop_id=my_shop.shop_id, 
                     stock=20,
-                    category=other, 
+                    category_id=other,
                     img_url='products/1.4.jpg'
                 ),
                 Item(
@@ -111,7 +105,7 @@ def seed_shop_items():
                     description="Hand-painted ceramic mug.",
                     shop_id=my_shop.shop_id, 
                     stock=20,
-                    category=other, 
+                    category_id=other,
                     img_url='products/1.5.jpg'
                 ), 
                 Item(
@@ -120,12 +114,82 @@ def seed_shop_items():
                     description="Hand-painted ceramic mug.",
                     shop_id=my_shop.shop_id, 
                     stock=20,
-                    category=other, 
+                    category_id=other,
                     img_url='products/1.5.jpg'
                 ),                 
             ]
             db.session.add_all(seed_items)
+            items_added(my_shop.shop_id, [(item.price, item.stock) for item in seed_items])
             db.session.commit()
             print("✅ Default Items Seeded for zian user only.")
         else:
-            print("Items already exist for this shop. Skipping.")
\ No newline at end of file
+            print("Items already exist for this shop. Skipping.")
+
+
+# --- SYNTHETIC DATA (benchmarks) ---
+BENCH_PASSWORD = 'bench-password'
+_ADJECTIVES = ['Handmade', 'Woven', 'Ceramic', 'Rustic', 'Painted', 'Carved', 'Glazed',
+               'Embroidered', 'Vintage', 'Minimalist', 'Scented', 'Beaded', 'Upcycled']
+_NOUNS = ['Bowl', 'Mug', 'Bag', 'Vase', 'Necklace', 'Candle', 'Soap', 'Coaster', 'Tote',
+          'Earrings', 'Planter', 'Notebook', 'Basket', 'Plate', 'Wallet']
+_MATERIALS = ['mahogany', 'clay', 'abaca', 'rattan', 'leather', 'resin', 'cotton',
+              'silver', 'beeswax', 'coconut shell', 'bamboo', 'linen']
+
+
+def seed_synthetic(shops=10, items_per_shop=100, categories=10, seed=42):
+    """
+    Create `shops` owners + shops ('bench_<n>', password BENCH_PASSWORD), each
+    with `items_per_shop` items spread over `categories` categories. Uses the
+    bulk import path, so it scales to millions of rows. Owners that already
+    exist are skipped, so re-running only tops up missing shops.
+    """
+    rng = random.Random(seed)
+    # Hash once: per-user scrypt would dominate seeding time
+    password_hash = password_hasher.hash(BENCH_PASSWORD)
+    usernames = [f'bench_{n}' for n in range(shops)]
+    existing = {name for (name,) in db.session.query(User.username).filter(User.username.in_(usernames))}
+    new_names = [name for name in usernames if name not in existing]
+    if not new_names:
+        print("Synthetic shops already exist. Skipping.")
+        return
+
+    db.session.execute(User.__table__.insert(), [
+        {'username': name, 'password_hash': password_hash, 'first_name': name,
+         'contact_num': 'N/A', 'profile_img_url': 'images/default.png'}
+        for name in new_names])
+    owners = db.session.query(User.user_id, User.username).filter(User.username.in_(new_names)).all()
+    db.session.execute(Shop.__table__.insert(), [
+        {'name': f'{name} Studio', 'description': 'Synthetic benchmark shop.', 'owner_id': user_id}
+        for user_id, name in owners])
+    shop_ids = [shop_id for (shop_id,) in db.session.query(Shop.shop_id)
+                .filter(Shop.owner_id.in_([user_id for user_id, _ in owners]))]
+    db.session.execute(ShopStats.__table__.insert(), [{'shop_id': shop_id} for shop_id in shop_ids])
+    db.session.commit()
+
+    category_names = [f'Bench Category {k}' for k in range(categories)]
+    for shop_id in shop_ids:
+        records = ((n, {
+            'name': f'{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}',
+            'description': f'Made from {rng.choice(_MATERIALS)} by local artisans.',
+            'price': round(rng.uniform(50, 5000), 2),
+            'stock': rng.randint(0, 100),
+            'category': rng.choice(category_names),
+            'img_url': f'products/{rng.randint(1, 20)}.{rng.randint(1, 5)}.jpg',
+        }) for n in range(items_per_shop))
+        import_items(shop_id, records)
+    print(f"✅ Seeded {len(shop_ids)} synthetic shops x {items_per_shop} items.")
+
+
+def seed_buyers(count):
+    """Create buyer accounts 'buyer_<n>' (password BENCH_PASSWORD) for load tests; idempotent."""
+    usernames = [f'buyer_{n}' for n in range(count)]
+    existing = {name for (name,) in db.session.query(User.username).filter(User.username.in_(usernames))}
+    new_names = [name for name in usernames if name not in existing]
+    if new_names:
+        password_hash = password_hasher.hash(BENCH_PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'username': name, 'password_hash': password_hash, 'first_name': name,
+             'contact_num': 'N/A', 'profile_img_url': 'images/default.png'}
+            for name in new_names])
+        db.session.commit()
+    return usernames
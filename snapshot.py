@@ -0,0 +1,333 @@
+"""
+In-process columnar snapshot of the catalogue for price-sorted listings.
+
+Every item is one row across parallel arrays (item_id, shop_id, category_id,
+price, stock), about 29 bytes a row, held sorted by (price, item_id). A
+query such as "category C, price in [X, Y), cheapest first, top N" is two
+binary searches for the price range and a vectorized mask over that slice;
+the first N matches are already in order. Only ids come back, and the
+caller hydrates them with one `item_id IN (...)` query.
+
+The columns are NumPy arrays when NumPy is installed, otherwise stdlib
+`array`s scanned in Python (same answers, slower scans).
+
+Refreshing is incremental and keyed on shop revisions, which every item
+write path bumps (fragments.bump_shop): a sync reads (shop_id, revision)
+for all shops and reloads only the items of shops whose revision moved, so
+writes made by other processes are picked up too. Reloaded rows go to a
+small sorted delta segment and their old rows are masked out of the main
+one; the two are merged once the delta or the dead rows grow too large.
+A commit in this process that wrote items marks the snapshot stale at
+once; otherwise it re-checks when the caller's catalog_version() changes,
+or every CATALOG_SNAPSHOT_MAX_AGE seconds when no version is given.
+"""
+import time
+import bisect
+import threading
+from array import array
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from models import db, Shop, Item
+
+try:
+    import numpy as np
+except ImportError:  # optional; without it the columns are stdlib arrays
+    np = None
+
+# (column, array typecode); item_id is 64-bit, the rest fit in 32
+COLUMNS = (('item_id', 'q'), ('shop_id', 'i'), ('category_id', 'i'), ('price', 'd'), ('stock', 'i'))
+LOAD_BATCH = 20000
+SCAN_CHUNK = 65536
+# Merge the delta into the main segment past this many rows or this dead fraction
+COMPACT_DELTA_ROWS = 50000
+COMPACT_DEAD_FRACTION = 0.25
+SHOPS_PER_RELOAD = 500   # shop ids per IN (...) when reloading changed shops
+
+
+def _row_columns():
+    return (Item.item_id, Item.shop_id, Item.category_id, Item.price,
+            func.coalesce(Item.stock, 0))
+
+
+class Segment:
+    """Parallel columns sorted by (price, item_id), plus a live-row mask."""
+
+    __slots__ = ('item_id', 'shop_id', 'category_id', 'price', 'stock', 'alive', 'dead')
+
+    def __init__(self, columns, alive=None, dead=0):
+        for name, column in zip(self.__slots__, columns):
+            setattr(self, name, np.asarray(column) if np is not None else column)
+        size = len(self.item_id)
+        if alive is None:
+            alive = np.ones(size, dtype=bool) if np is not None else bytearray(b'\x01') * size
+        self.alive = alive
+        self.dead = dead
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (item_id, shop_id, category_id, price, stock) rows already in order."""
+        columns = [array(code) for _, code in COLUMNS]
+        for batch in rows:
+            for position, column in enumerate(columns):
+                column.extend(row[position] for row in batch)
+        return cls(columns)
+
+    def __len__(self):
+        return len(self.item_id)
+
+    @property
+    def nbytes(self):
+        return sum(len(column) * getattr(column, 'itemsize', 1) for column in
+                   (self.item_id, self.shop_id, self.category_id, self.price, self.stock, self.alive))
+
+    def live_rows(self):
+        columns = [getattr(self, name) for name, _ in COLUMNS]
+        if np is not None:
+            columns = [column.tolist() for column in columns]
+        return [row for row, alive in zip(zip(*columns), self.alive) if alive]
+
+    def without_shops(self, shop_ids):
+        """A copy-on-write view with every row of `shop_ids` masked out."""
+        if np is not None:
+            drop = self.alive & np.isin(self.shop_id, list(shop_ids))
+            alive = self.alive & ~drop
+            dropped = int(drop.sum())
+        else:
+            alive = bytearray(self.alive)
+            dropped = 0
+            for index, shop_id in enumerate(self.shop_id):
+                if shop_id in shop_ids and alive[index]:
+                    alive[index] = 0
+                    dropped += 1
+        if not dropped:
+            return self
+        segment = Segment.__new__(Segment)
+        for name in self.__slots__:
+            setattr(segment, name, getattr(self, name))
+        segment.alive, segment.dead = alive, self.dead + dropped
+        return segment
+
+    # --- querying ---
+    def _search(self, column, value, side, lo=0, hi=None):
+        hi = len(column) if hi is None else hi
+        if np is not None:
+            return lo + int(np.searchsorted(column[lo:hi], value, side))
+        return (bisect.bisect_left if side == 'left' else bisect.bisect_right)(column, value, lo, hi)
+
+    def scan(self, min_price, max_price, category_id, in_stock, after, limit):
+        """Up to `limit` (price, item_id) keys in order: min_price <= price < max_price, past `after`."""
+        start = 0 if min_price is None else self._search(self.price, min_price, 'left')
+        stop = len(self) if max_price is None else self._search(self.price, max_price, 'left')
+        if after is not None:
+            # First key strictly greater than (price, item_id), as the SQL keyset seek
+            price, item_id = after
+            first = self._search(self.price, price, 'left')
+            last = self._search(self.price, price, 'right', first)
+            start = max(start, self._search(self.item_id, item_id, 'right', first, last))
+
+        keys = []
+        if np is None:
+            for index in range(start, stop):
+                if self.alive[index] and (category_id is None or self.category_id[index] == category_id) \
+                        and (not in_stock or self.stock[index] > 0):
+                    keys.append((self.price[index], self.item_id[index]))
+                    if len(keys) == limit:
+                        break
+            return keys
+        # Chunked so a broad range stops as soon as `limit` rows matched
+        for begin in range(start, stop, SCAN_CHUNK):
+            end = min(begin + SCAN_CHUNK, stop)
+            mask = self.alive[begin:end]
+            if category_id is not None:
+                mask = mask & (self.category_id[begin:end] == category_id)
+            if in_stock:
+                mask = mask & (self.stock[begin:end] > 0)
+            hits = np.flatnonzero(mask)[:limit - len(keys)] + begin
+            keys.extend(zip(self.price[hits].tolist(), self.item_id[hits].tolist()))
+            if len(keys) == limit:
+                break
+        return keys
+
+
+def _sorted_segment(rows):
+    rows.sort(key=lambda row: (row[3], row[0]))
+    return Segment.from_rows([rows])
+
+
+def _merge(main, rows):
+    """One segment holding main's live rows plus `rows`, re-sorted."""
+    if np is None:
+        return _sorted_segment(main.live_rows() + rows)
+    extra = Segment.from_rows([rows])
+    columns = [np.concatenate((getattr(main, name)[main.alive], getattr(extra, name)))
+               for name, _ in COLUMNS]
+    order = np.lexsort((columns[0], columns[3]))   # by price, then item_id
+    return Segment([column[order] for column in columns])
+
+
+class SnapshotState:
+    """One immutable generation of the snapshot; syncs build a new one and swap it in."""
+
+    def __init__(self, main, delta, revisions, version):
+        self.main = main
+        self.delta = delta
+        self.revisions = revisions
+        self.version = version
+        self.checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.main) - self.main.dead + len(self.delta) - self.delta.dead
+
+
+class SnapshotStore:
+    """One app's snapshot generations, sync lock and counters."""
+
+    def __init__(self, max_age=5):
+        self.max_age = max_age
+        self._state = None
+        self._stale = False
+        self._lock = threading.Lock()
+        self.syncs = 0
+        self.reloaded_shops = 0
+        self.compactions = 0
+
+    def mark_stale(self):
+        self._stale = True
+
+    # --- refresh ---
+    def _fresh(self, state, version):
+        if state is None or self._stale:
+            return False
+        if version is not None:
+            return state.version == version
+        return time.monotonic() - state.checked_at < self.max_age
+
+    def sync(self, version=None):
+        """
+        Bring the snapshot up to date if it may be behind `version` (a
+        catalog_version() string) or, without one, older than max_age.
+        Threads that find another sync under way keep using the current
+        generation instead of waiting. Needs an app context.
+        """
+        state = self._state
+        if self._fresh(state, version):
+            return state
+        if not self._lock.acquire(blocking=state is None):
+            return state
+        try:
+            state = self._state
+            if not self._fresh(state, version):
+                self._stale = False
+                state = self._state = self._refresh(state, version)
+                self.syncs += 1
+            return state
+        finally:
+            self._lock.release()
+
+    def _refresh(self, state, version):
+        # Revisions first: an item write landing after this read only makes
+        # the rows loaded below newer, and the next sync reloads that shop again
+        revisions = dict(db.session.execute(select(Shop.shop_id, Shop.revision)).all())
+        if state is None:
+            result = db.session.execute(
+                select(*_row_columns()).order_by(Item.price, Item.item_id)
+                .execution_options(yield_per=LOAD_BATCH))
+            main = Segment.from_rows(result.partitions())
+            return SnapshotState(main, Segment.from_rows([]), revisions, version)
+
+        changed = {shop_id for shop_id, revision in revisions.items()
+                   if state.revisions.get(shop_id) != revision}
+        changed |= state.revisions.keys() - revisions.keys()   # deleted shops
+        if not changed:
+            return SnapshotState(state.main, state.delta, revisions, version)
+
+        rows = []
+        shop_ids = sorted(changed)
+        for offset in range(0, len(shop_ids), SHOPS_PER_RELOAD):
+            rows.extend(tuple(row) for row in db.session.execute(
+                select(*_row_columns()).where(Item.shop_id.in_(shop_ids[offset:offset + SHOPS_PER_RELOAD]))))
+        self.reloaded_shops += len(changed)
+
+        main = state.main.without_shops(changed)
+        delta_rows = state.delta.without_shops(changed).live_rows() + rows
+        if len(delta_rows) > COMPACT_DELTA_ROWS or main.dead > COMPACT_DEAD_FRACTION * len(main):
+            self.compactions += 1
+            return SnapshotState(_merge(main, delta_rows), Segment.from_rows([]), revisions, version)
+        return SnapshotState(main, _sorted_segment(delta_rows), revisions, version)
+
+    # --- queries ---
+    def price_range(self, min_price=None, max_price=None, category_id=None, in_stock=False,
+                    limit=24, after=None, version=None):
+        """
+        Ids of up to `limit` items with min_price <= price < max_price (either
+        bound optional), optionally in one category and/or in stock, cheapest
+        first with item_id breaking ties. `after` is a (price, item_id) key to
+        continue from, as in pagination's 'price' sort.
+        """
+        state = self.sync(version)
+        keys = state.main.scan(min_price, max_price, category_id, in_stock, after, limit)
+        if len(state.delta):
+            keys = sorted(keys + state.delta.scan(min_price, max_price, category_id,
+                                                  in_stock, after, limit))[:limit]
+        return [item_id for _, item_id in keys]
+
+    def stats(self):
+        state = self._state
+        if state is None:
+            return {'rows': 0, 'dead': 0, 'delta': 0, 'bytes': 0, 'syncs': self.syncs,
+                    'reloaded_shops': self.reloaded_shops, 'compactions': self.compactions}
+        return {
+            'rows': len(state),
+            'dead': state.main.dead + state.delta.dead,
+            'delta': len(state.delta),
+            'bytes': state.main.nbytes + state.delta.nbytes,
+            'syncs': self.syncs,
+            'reloaded_shops': self.reloaded_shops,
+            'compactions': self.compactions,
+        }
+
+
+class CatalogSnapshot:
+    """
+    The extension: init_app gives the app its own SnapshotStore in
+    app.extensions['catalog_snapshot'] (the app factory only calls it when
+    CATALOG_SNAPSHOT is set); the methods act on the current app's store.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_SNAPSHOT_MAX_AGE', 5)
+        app.extensions['catalog_snapshot'] = SnapshotStore(app.config['CATALOG_SNAPSHOT_MAX_AGE'])
+
+    @staticmethod
+    def store():
+        return current_app.extensions['catalog_snapshot']
+
+    def sync(self, version=None):
+        return self.store().sync(version)
+
+    def price_range(self, *args, **kwargs):
+        return self.store().price_range(*args, **kwargs)
+
+    def stats(self):
+        return self.store().stats()
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+# bump_shop() flags the session; once that transaction commits, resync on next use
+@event.listens_for(db.session, 'after_commit')
+def _items_committed(session):
+    if session.info.pop('items_written', False) and has_app_context():
+        store = current_app.extensions.get('catalog_snapshot')
+        if store is not None:
+            store.mark_stale()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _items_rolled_back(session):
+    session.info.pop('items_written', None)
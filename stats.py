@@ -0,0 +1,91 @@
+from sqlalchemy import func
+from models import db, Shop, Item, ShopStats
+
+# Float sums drift by rounding; differences below this are not reported.
+VALUE_TOLERANCE = 0.005
+
+
+def apply_delta(shop_id, items=0, stock=0, value=0.0):
+    """
+    Add deltas to a shop's summary row inside the caller's transaction. A single
+    relative UPDATE, so concurrent writers never overwrite each other's totals.
+    Call it after the item change has been added to the session.
+    """
+    updated = ShopStats.query.filter_by(shop_id=shop_id).update({
+        'item_count': ShopStats.item_count + items,
+        'total_stock': ShopStats.total_stock + stock,
+        'total_value': ShopStats.total_value + value,
+    }, synchronize_session=False)
+    if not updated:
+        # Shops created before the summary table existed start from a full recount.
+        db.session.add(recount(shop_id))
+
+
+def _value(price, stock):
+    return float(price or 0) * (stock or 0)
+
+
+def item_added(item):
+    apply_delta(item.shop_id, 1, item.stock or 0, _value(item.price, item.stock))
+
+
+def item_changed(item, old_price, old_stock):
+    apply_delta(item.shop_id, 0, (item.stock or 0) - (old_stock or 0),
+                _value(item.price, item.stock) - _value(old_price, old_stock))
+
+
+def item_removed(item):
+    apply_delta(item.shop_id, -1, -(item.stock or 0), -_value(item.price, item.stock))
+
+
+def items_added(shop_id, rows):
+    """Bulk variant for imports: rows are (price, stock) pairs."""
+    rows = list(rows)
+    apply_delta(shop_id, len(rows), sum(stock or 0 for _, stock in rows),
+                sum(_value(price, stock) for price, stock in rows))
+
+
+def _actual_totals(shop_id=None):
+    query = db.session.query(Item.shop_id,
+                             func.count(Item.item_id),
+                             func.coalesce(func.sum(Item.stock), 0),
+                             func.coalesce(func.sum(Item.price * Item.stock), 0.0))
+    if shop_id is not None:
+        query = query.filter(Item.shop_id == shop_id)
+    return {row[0]: row[1:] for row in query.group_by(Item.shop_id)}
+
+
+def recount(shop_id):
+    count, stock, value = _actual_totals(shop_id).get(shop_id, (0, 0, 0.0))
+    return ShopStats(shop_id=shop_id, item_count=count, total_stock=stock, total_value=value)
+
+
+def get_stats(shop_id):
+    return db.session.get(ShopStats, shop_id) or ShopStats(
+        shop_id=shop_id, item_count=0, total_stock=0, total_value=0.0)
+
+
+def reconcile(fix=False):
+    """
+    Recompute every shop's totals from items in one grouped query and compare
+    with the stored summary. Returns a list of (shop_id, stored, actual) for
+    rows that drifted; with fix=True they are overwritten and committed.
+    """
+    actual = _actual_totals()
+    stored = {s.shop_id: s for s in ShopStats.query.all()}
+    drift = []
+    for (shop_id,) in db.session.query(Shop.shop_id):
+        count, stock, value = actual.get(shop_id, (0, 0, 0.0))
+        row = stored.get(shop_id)
+        current = (row.item_count, row.total_stock, row.total_value) if row else None
+        if current and current[:2] == (count, stock) and abs(current[2] - value) < VALUE_TOLERANCE:
+            continue
+        drift.append((shop_id, current, (count, stock, value)))
+        if fix:
+            if row is None:
+                row = ShopStats(shop_id=shop_id)
+                db.session.add(row)
+            row.item_count, row.total_stock, row.total_value = count, stock, value
+    if fix:
+        db.session.commit()
+    return drift
@@ -0,0 +1,132 @@
+import os
+import re
+import hashlib
+import secrets
+from flask import current_app
+from models import db, MediaBlob
+from images import DERIVATIVE_WIDTHS, derivative_name
+
+# Content-addressed files are named after the SHA-256 of the original upload,
+# e.g. 'products/<sha256>-640.webp' or 'artisans/<sha256>.png'. Their bytes can
+# never change, so they are safe to cache forever.
+_CONTENT_ADDRESSED_RE = re.compile(r'(^|/)[0-9a-f]{64}(-\d+)?\.[a-z0-9]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_CHUNK = 64 * 1024
+
+
+def is_content_addressed(filename):
+    return bool(_CONTENT_ADDRESSED_RE.search(filename or ''))
+
+
+def blob_key(folder, digest):
+    return f'{folder}/{digest}'
+
+
+def _copy_hashing(form_picture, dest_path):
+    """Stream the upload to dest_path, returning its SHA-256 hex digest."""
+    sha = hashlib.sha256()
+    stream = form_picture.stream
+    stream.seek(0)
+    with open(dest_path, 'wb') as out:
+        for chunk in iter(lambda: stream.read(_CHUNK), b''):
+            sha.update(chunk)
+            out.write(chunk)
+    return sha.hexdigest()
+
+
+def stage_upload(form_picture, staging_folder):
+    """Copy an upload into the staging folder. Returns (digest, staged path)."""
+    os.makedirs(staging_folder, exist_ok=True)
+    path = os.path.join(staging_folder, secrets.token_hex(8))
+    return _copy_hashing(form_picture, path), path
+
+
+def store_original(form_picture, folder):
+    """Store an upload as-is under its content hash. Returns (key, img_url)."""
+    upload_folder = os.path.join(current_app.root_path, 'static', folder)
+    digest, staged = stage_upload(form_picture, upload_folder)
+    _, f_ext = os.path.splitext(form_picture.filename)
+    picture_fn = digest + f_ext.lower()
+    os.replace(staged, os.path.join(upload_folder, picture_fn))
+    return blob_key(folder, digest), f'{folder}/{picture_fn}'
+
+
+def find_blob(key):
+    return db.session.get(MediaBlob, key)
+
+
+# --- reference counting ---
+# Counts are changed with single UPDATE statements inside the caller's
+# transaction; files are only removed later by collect_garbage().
+def acquire(key, url):
+    updated = MediaBlob.query.filter_by(key=key) \
+        .update({'ref_count': MediaBlob.ref_count + 1}, synchronize_session=False)
+    if not updated:
+        db.session.add(MediaBlob(key=key, url=url, ref_count=1))
+
+
+def acquire_urls(counts):
+    """
+    Take counts[url] more references on images that are already stored, e.g.
+    URLs carried over by an item import. Returns the URLs that had a blob;
+    the rest are unknown (or were just collected) and must not be used.
+    """
+    known = set()
+    for url, count in counts.items():
+        updated = MediaBlob.query.filter_by(url=url) \
+            .update({'ref_count': MediaBlob.ref_count + count}, synchronize_session=False)
+        if updated:
+            known.add(url)
+    return known
+
+
+def release(url):
+    """Drop one reference to url. Legacy (non content-addressed) images are ignored."""
+    if not is_content_addressed(url):
+        return
+    MediaBlob.query.filter_by(url=url) \
+        .update({'ref_count': MediaBlob.ref_count - 1}, synchronize_session=False)
+
+
+def point_to(target, attr, key, url):
+    """Repoint target.<attr> at a stored image, moving the reference from the old one."""
+    old_url = getattr(target, attr)
+    if old_url == url:
+        return
+    acquire(key, url)
+    release(old_url)
+    setattr(target, attr, url)
+
+
+def blob_files(url):
+    """All files on disk (relative to static/) that belong to a stored image."""
+    folder, filename = url.rsplit('/', 1)
+    stem, ext = os.path.splitext(filename)
+    if ext != '.jpg' or '-' not in stem:
+        return [url]
+    digest = stem.split('-', 1)[0]
+    return [f'{folder}/{derivative_name(digest, w, e)}'
+            for w in set(DERIVATIVE_WIDTHS) | {int(stem.rsplit('-', 1)[1])}
+            for e in ('jpg', 'webp')]
+
+
+def collect_garbage():
+    """Delete unreferenced blobs and their files. Call after the releasing commit."""
+    static_root = os.path.join(current_app.root_path, 'static')
+    removed = 0
+    orphans = db.session.query(MediaBlob.key, MediaBlob.url).filter(MediaBlob.ref_count <= 0).all()
+    for key, url in orphans:
+        # Conditional delete: a concurrent upload may have re-acquired it meanwhile.
+        deleted = MediaBlob.query.filter(MediaBlob.key == key, MediaBlob.ref_count <= 0) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        if not deleted:
+            continue
+        for rel_path in blob_files(url):
+            try:
+                os.remove(os.path.join(static_root, rel_path))
+            except FileNotFoundError:
+                pass
+        removed += 1
+    return removed
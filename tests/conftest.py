@@ -0,0 +1,86 @@
+import os
+import sys
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import TestingConfig, engine_options
+from models import db, User
+from principal import user_cache
+from categories import category_cache
+from seed import seed_synthetic, BENCH_PASSWORD
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    Build apps on SQLite files under tmp_path, with the schema created.
+    Keyword arguments override config values.
+    """
+    def factory(**overrides):
+        uri = f"sqlite:///{tmp_path / 'primary.db'}"
+        settings = {'SQLALCHEMY_DATABASE_URI': uri,
+                    'SQLALCHEMY_ENGINE_OPTIONS': engine_options(uri),
+                    'SQLALCHEMY_REPLICAS': []}
+        settings.update(overrides)
+        app = create_app(type('Config', (TestingConfig,), settings))
+        with app.app_context():
+            db.create_all()
+        return app
+
+    yield factory
+    # Process-wide caches would carry ids over into the next test's database
+    category_cache.invalidate()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed_shops(app):
+    """seed_shops(shops, items) -> owner usernames; each owner logs in with BENCH_PASSWORD."""
+    def seed(shops=1, items=10):
+        with app.app_context():
+            seed_synthetic(shops=shops, items_per_shop=items, categories=3)
+            usernames = [f'bench_{n}' for n in range(shops)]
+            for (user_id,) in db.session.query(User.user_id).filter(User.username.in_(usernames)):
+                user_cache.invalidate(user_id)
+        return usernames
+    return seed
+
+
+@pytest.fixture
+def login(client):
+    def log_in(username, password=BENCH_PASSWORD):
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302 and '/login' not in response.location
+        return response
+    return log_in
+
+
+@pytest.fixture
+def queries(app):
+    """
+    SQL statements sent to the primary engine, in order. Unlike
+    querycount.count_queries this spans whole requests, including login
+    and session loading, not only the view body.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
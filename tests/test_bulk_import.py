@@ -0,0 +1,43 @@
+import io
+from models import db, Item, ShopStats
+from bulk import iter_records, import_items
+
+
+def _records(text, fmt='csv'):
+    return iter_records(io.BytesIO(text.encode()), fmt)
+
+
+def test_non_finite_prices_are_rejected_per_row(app, seed_shops):
+    seed_shops(shops=1, items=0)
+    source = ('name,price,stock,category\n'
+              'Bowl,12.5,3,Ceramics\n'
+              'Vase,nan,1,Ceramics\n'
+              'Mat,inf,1,Woven\n')
+    with app.app_context():
+        report = import_items(1, _records(source))
+        assert (report.inserted, report.failed) == (1, 2)
+        assert [line for line, _ in report.errors] == [3, 4]
+        assert db.session.query(Item.name).scalar() == 'Bowl'
+
+
+def test_database_errors_are_reported_not_raised(app, seed_shops, monkeypatch):
+    seed_shops(shops=1, items=0)
+    # Stands in for any constraint the database enforces and _clean doesn't
+    monkeypatch.setattr('bulk._clean', lambda record: {**record, 'price': None, 'stock': 0,
+                                                        'description': None, 'img_url': 'x.jpg'})
+    with app.app_context():
+        report = import_items(1, _records('{"name": "Bowl", "category": "Ceramics"}\n', 'jsonl'))
+        assert (report.inserted, report.failed) == (0, 1)
+        assert 'database rejected' in report.errors[0][1]
+        assert db.session.get(ShopStats, 1).item_count == 0
+
+
+def test_import_command_requires_an_existing_shop(app, tmp_path):
+    source = tmp_path / 'items.csv'
+    source.write_text('name,price,stock,category\nBowl,1,1,Ceramics\n')
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['import-items', '999', str(source)])
+        assert result.exit_code == 2
+        assert 'no shop with id 999' in result.output
+        assert db.session.query(Item).count() == 0
+        assert db.session.query(ShopStats).count() == 0
@@ -0,0 +1,27 @@
+import pytest
+from pagination import encode_cursor, decode_cursor, InvalidCursor
+
+BAD_KEYS = [
+    [[1], 2],
+    [{'price': 1}, 2],
+    ['12.5', 2],
+    [True, 2],
+    [12.5, 2.5],
+    [float('nan'), 2],
+]
+
+
+@pytest.mark.parametrize('values', BAD_KEYS, ids=repr)
+def test_decode_rejects_non_numeric_keys(values):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(values), 2)
+
+
+def test_decode_round_trips_a_page_key():
+    assert decode_cursor(encode_cursor([12.5, 7]), 2) == [12.5, 7]
+
+
+@pytest.mark.parametrize('url', ['/api/shops/1/items?sort=price&after={}', '/catalog?sort=price&after={}'])
+def test_crafted_cursor_is_a_bad_request(client, seed_shops, url):
+    seed_shops(shops=1, items=3)
+    assert client.get(url.format(encode_cursor([[1, 2], {'a': 1}]))).status_code == 400
@@ -0,0 +1,36 @@
+"""
+SQL statements per page, for a logged-in shop owner with a warm principal
+cache. The counts must stay flat as the shop grows: a statement per item
+(an N+1) fails the larger case.
+"""
+import pytest
+
+BUDGETS = {
+    '/myshop': 2,      # shop, one page of items
+    '/dashboard': 2,   # shop, shop_stats row
+    '/catalog': 3,     # catalog version, one page of items, facet counts
+}
+
+
+@pytest.fixture(params=[5, 60], ids=lambda items: f'{items}-items')
+def owner_client(request, seed_shops, login, client):
+    [owner] = seed_shops(shops=1, items=request.param)
+    login(owner)
+    client.get('/')   # loads the cached principal
+    return client
+
+
+@pytest.mark.parametrize('url', sorted(BUDGETS))
+def test_page_within_budget(owner_client, queries, url):
+    queries.clear()
+    response = owner_client.get(url)
+    assert response.status_code == 200
+    assert len(queries) <= BUDGETS[url], '\n'.join(queries)
+
+
+def test_revalidation_stops_before_item_queries(owner_client, queries):
+    etag = owner_client.get('/myshop').headers['ETag']
+    queries.clear()
+    response = owner_client.get('/myshop', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert len(queries) == 1, '\n'.join(queries)   # the shop row only
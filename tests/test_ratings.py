@@ -0,0 +1,27 @@
+from models import db, Shop
+from ratings import rate_shop, remove_rating, top_rated, PRIOR_MEAN
+
+
+def test_unrated_shops_score_the_prior(app, seed_shops):
+    seed_shops(shops=1, items=0)
+    with app.app_context():
+        assert db.session.get(Shop, 1).rating_score == PRIOR_MEAN
+        rate_shop(1, 1, 5)
+        remove_rating(1, 1)
+        db.session.commit()
+        assert db.session.get(Shop, 1).rating_score == PRIOR_MEAN
+
+
+def test_top_rated_lists_unrated_shops_after_rated_ones(app, seed_shops):
+    seed_shops(shops=3, items=0)
+    with app.app_context():
+        rate_shop(1, 1, 2)   # below the prior, still ranked first
+        db.session.commit()
+        assert [shop.shop_id for shop in top_rated()] == [1, 3, 2]
+        assert [shop.shop_id for shop in top_rated(limit=2)] == [1, 3]
+
+
+def test_shop_list_on_a_fresh_install(client, seed_shops):
+    seed_shops(shops=2, items=0)
+    page = client.get('/shops').data
+    assert b'bench_0 Studio' in page and b'bench_1 Studio' in page
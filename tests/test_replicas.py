@@ -0,0 +1,126 @@
+"""
+Read/write routing against a second SQLite file standing in for a replica.
+Each test records which engine every statement went to.
+"""
+import time
+import pytest
+from flask import g
+from sqlalchemy import event, inspect, select
+from models import db, Shop, User
+from replicas import PRIMARY_UNTIL
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(SQLALCHEMY_REPLICAS=[f"sqlite:///{tmp_path / 'replica.db'}"])
+
+
+@pytest.fixture
+def routed(app):
+    """{'primary': [...], 'replica': [...]}: statements per engine, in order."""
+    with app.app_context():
+        engines = {'primary': db.engine, 'replica': app.extensions['replicas'][0]}
+    statements = {name: [] for name in engines}
+    listeners = []
+    for name, engine in engines.items():
+        def record(conn, cursor, statement, parameters, context, executemany, name=name):
+            statements[name].append(statement)
+        event.listen(engine, 'before_cursor_execute', record)
+        listeners.append((engine, record))
+    yield statements
+    for engine, record in listeners:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def synced(app, seed_shops):
+    """One seeded shop, copied to the replica; returns the owner's username."""
+    [owner] = seed_shops(shops=1, items=5)
+    _sync_replicas(app)
+    return owner
+
+
+def _sync_replicas(app):
+    # `flask` runs commands in an app context; the test runner doesn't
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['sync-replicas'])
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def _clear(routed):
+    for statements in routed.values():
+        statements.clear()
+
+
+def test_sync_replicas_copies_primary(app, seed_shops):
+    replica = app.extensions['replicas'][0]
+    assert inspect(replica).get_table_names() == []
+
+    seed_shops(shops=2, items=3)
+    assert '1 replica(s) refreshed.' in _sync_replicas(app).output
+    with replica.connect() as conn:
+        assert conn.execute(select(User.username).order_by(User.username)).scalars().all() \
+            == ['bench_0', 'bench_1']
+
+
+def test_get_reads_from_replica(client, synced, routed):
+    _clear(routed)
+    response = client.get('/shops')
+    assert response.status_code == 200
+    assert routed['replica'] and not routed['primary']
+
+
+def test_replica_lag_is_visible_to_anonymous_reads(app, client, synced):
+    # Only on the primary: a GET that can't see it proves it read the replica
+    with app.app_context():
+        db.session.execute(Shop.__table__.update().values(name='Renamed on primary'))
+        db.session.commit()
+    assert b'Renamed on primary' not in client.get('/shops/1').data
+
+
+def test_post_uses_primary(client, synced, routed):
+    _clear(routed)
+    client.post('/login', data={'username': synced, 'password': 'wrong'})
+    assert routed['primary'] and not routed['replica']
+
+
+def test_statements_after_a_write_use_primary(app, synced, routed):
+    with app.test_request_context('/shops'):
+        app.preprocess_request()
+        assert g.db_replica is app.extensions['replicas'][0]
+
+        db.session.execute(select(Shop.shop_id)).all()
+        assert routed['replica'] and not routed['primary']
+        _clear(routed)
+
+        db.session.execute(Shop.__table__.update().values(name='Renamed'))
+        db.session.execute(select(Shop.name)).all()
+        assert len(routed['primary']) == 2 and not routed['replica']
+
+        db.session.commit()
+        assert g.db_replica is None   # the rest of the request reads its own write
+
+
+def test_reads_inside_write_window_use_primary(client, synced, login, routed):
+    login(synced)
+    client.post('/cart/add/1', data={'quantity': 1})
+    with client.session_transaction() as session:
+        assert session[PRIMARY_UNTIL] > time.time()
+
+    _clear(routed)
+    assert client.get('/cart').status_code == 200
+    assert routed['primary'] and not routed['replica']
+
+
+def test_reads_after_write_window_use_replica(client, synced, login, routed):
+    login(synced)
+    client.post('/cart/add/1', data={'quantity': 1})
+    with client.session_transaction() as session:
+        session[PRIMARY_UNTIL] = time.time() - 1
+
+    _clear(routed)
+    assert client.get('/shops').status_code == 200
+    assert routed['replica'] and not routed['primary']
+    with client.session_transaction() as session:
+        assert PRIMARY_UNTIL not in session
@@ -1,34 +1,25 @@
-import os, secrets
-from flask import current_app
-from werkzeug.utils import secure_filename
-from models import db, Category
+from models import db, Category, Item
+from categories import category_id
+from images import pipeline_available
+from storage import store_original, point_to
+from jobs import image_worker
 
-def save_picture(form_picture):
-    """Renames uploaded image to random hex to avoid collision and saves it."""
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/products', picture_fn)
-    form_picture.save(picture_path)
-    return 'products/' + picture_fn
-
-def save_profile_picture(form_picture):
-    """Renames profile image and saves it in static/artisans."""
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = secure_filename(random_hex + f_ext)
-    upload_folder = os.path.join(current_app.root_path, 'static/artisans')
-    os.makedirs(upload_folder, exist_ok=True)
-    picture_path = os.path.join(upload_folder, picture_fn)
-    form_picture.save(picture_path)
-    return f'artisans/{picture_fn}'
+def attach_picture(target, form_picture):
+    """
+    Hand an upload for an Item or User to the background image worker. The
+    caller commits, then calls image_worker.kick(). Without Pillow there is
+    nothing CPU-heavy to offload, so the file is saved inline instead.
+    """
+    if pipeline_available():
+        image_worker.submit(target, form_picture)
+    elif isinstance(target, Item):
+        point_to(target, 'img_url', *store_original(form_picture, 'products'))
+    else:
+        point_to(target, 'profile_img_url', *store_original(form_picture, 'artisans'))
 
 def get_or_create_category(category_name):
-    """Standardize category name and create if not exists."""
-    clean_name = category_name.strip().title()
-    category = Category.query.filter_by(name=clean_name).first()
-    if not category:
-        category = Category(name=clean_name)
-        db.session.add(category)
-        db.session.commit()
-    return category
+    """
+    Standardize category name and create if not exists. Runs in the caller's
+    transaction (no commit of its own); see categories.category_id.
+    """
+    return db.session.get(Category, category_id(category_name))
@@ -1,17 +1,37 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
-from sqlalchemy import func
-from forms import RegistrationForm, LoginForm, UserProfileForm, ShopForm, ItemForm
-from models import db, User, Shop, Item, Address, Category
-from utils import save_picture, save_profile_picture, get_or_create_category  
+from datetime import datetime
+from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError
+from forms import RegistrationForm, LoginForm, UserProfileForm, ShopForm, ItemForm, ItemImportForm, Add_to_cart, CartLineForm, CheckoutForm, Rate_shop
+from models import db, User, Shop, Item, Address, Category, ShopStats, CartLine, OrderLine
+from utils import attach_picture
+from categories import category_id
+from jobs import image_worker
+from storage import release, collect_garbage
+from querycount import query_budget
+from stats import item_added, item_changed, item_removed, get_stats
+from search import search_items
+from fragments import bump_shop
+from conditional import conditional, form_token_window
+from bulk import iter_records, import_items, export_items, FORMATS
+from principal import user_cache
+from passwords import password_hasher, VerifierBusy
+from pagination import keyset_page, InvalidCursor, SORTS, DEFAULT_PAGE_SIZE
+from catalog import parse_filters, catalog_version, browse, PRICE_BUCKETS
+from cart import load_cart, add_to_cart, set_quantity, checkout
+from inventory import InsufficientStock
+from ratings import rate_shop, remove_rating, user_rating, top_rated
 
 views_bp = Blueprint('views', __name__, url_prefix='/')
 
 # --- HOME ROUTE ---
 @views_bp.route('/')
 def home():
-    return render_template("base.html") # Or create a home.html
+    conditional('home')
+    return render_template("home.html")
 
 
 # ---------------------------------------------- AUTHENTICATION ROUTES ---------------------------------------------
@@ -29,9 +49,21 @@ def login():
             flash("Username not found.", "warning")
             return redirect(url_for("views.login"))
 
-        if not user.check_password(form.password.data):
+        # Verified on a bounded pool; under a login storm excess attempts are shed
+        try:
+            valid = password_hasher.verify_bounded(user.password_hash, form.password.data)
+        except VerifierBusy:
+            flash("We're handling a lot of sign-ins right now. Please try again in a moment.", "warning")
+            return render_template("login.html", form=form), 503
+
+        if not valid:
             flash("Incorrect password.", "danger")
         else:
+            # Upgrade hashes made with an older scheme/cost while we have the plaintext
+            if password_hasher.needs_rehash(user.password_hash):
+                user.set_password(form.password.data)
+                db.session.commit()
+
             login_user(user, remember=form.remember_me.data)
             flash(f"Welcome back, {user.first_name}!", "success")
             
@@ -78,12 +110,134 @@ def sign_up():
     return render_template('signup.html', form=form)
 
 
+# --------------------------------------------------- SEARCH ------------------------------------------------------
+SEARCH_PAGE_SIZE = 20
+
+def _run_search():
+    """Search using the q, category, min_price, max_price and page query args."""
+    page = max(request.args.get('page', 1, type=int), 1)
+    results = search_items(
+        request.args.get('q', ''),
+        category=request.args.get('category') or None,
+        min_price=request.args.get('min_price', type=float),
+        max_price=request.args.get('max_price', type=float),
+        limit=SEARCH_PAGE_SIZE,
+        offset=(page - 1) * SEARCH_PAGE_SIZE,
+    )
+    return results, page
+
+
+@views_bp.route('/search')
+def search():
+    results, page = _run_search()
+    return render_template('search.html', results=results, page=page,
+                           has_next=len(results) == SEARCH_PAGE_SIZE)
+
+
+@views_bp.route('/api/search')
+def api_search():
+    results, page = _run_search()
+    return jsonify(
+        page=page,
+        results=[dict(r, img_url=url_for('static', filename=r['img_url']),
+                      name_html=str(r['name_html']), snippet_html=str(r['snippet_html']))
+                 for r in results],
+    )
+
+
+# --- CATALOGUE: items across all shops, with category and price facets ---
+# GET /catalog?category=<id>&price=<bucket>&sort=id|price&after=<cursor>&limit=<n>
+def _run_catalog(*etag_parts):
+    filters = parse_filters(request.args)
+    version = catalog_version()
+    # Nothing in any shop changed since the client's copy: 304 before any item query
+    conditional('catalog', version, *etag_parts)
+    try:
+        return filters, browse(filters, version)
+    except InvalidCursor:
+        abort(400)
+
+
+@views_bp.route('/catalog')
+def catalog():
+    # The add-to-cart forms carry CSRF tokens, which expire
+    filters, result = _run_catalog(form_token_window())
+    return render_template('catalog.html', filters=filters, price_buckets=PRICE_BUCKETS,
+                           cart_form=Add_to_cart(), **result)
+
+
+@views_bp.route('/api/catalog')
+def api_catalog():
+    _, result = _run_catalog()
+    for item in result['items']:
+        item['img_url'] = url_for('static', filename=item['img_url'])
+    return jsonify(**result)
+
+
+# ------------------------------------------------------ CART ROUTES ---------------------------------------------
+# Lines live in cart_lines, not the cookie session; each read or change is one statement.
+@views_bp.route('/cart')
+@login_required
+@query_budget(1)
+def cart():
+    return render_template('cart.html', cart=load_cart(current_user.user_id),
+                           line_form=CartLineForm(), checkout_form=CheckoutForm())
+
+
+@views_bp.route('/cart/add/<int:item_id>', methods=['POST'])
+@login_required
+@query_budget(1)
+def cart_add(item_id):
+    form = Add_to_cart()
+    if form.validate_on_submit():
+        add_to_cart(current_user.user_id, item_id, form.quantity.data)
+        db.session.commit()
+        flash('Added to your cart.', 'success')
+    else:
+        flash('Could not add that to your cart.', 'warning')
+    return redirect(request.referrer or url_for('views.cart'))
+
+
+@views_bp.route('/cart/update/<int:item_id>', methods=['POST'])
+@login_required
+@query_budget(1)
+def cart_update(item_id):
+    form = CartLineForm()
+    if form.validate_on_submit():
+        set_quantity(current_user.user_id, item_id, form.quantity.data or 0)
+        db.session.commit()
+    return redirect(url_for('views.cart'))
+
+
+@views_bp.route('/checkout', methods=['POST'])
+@login_required
+def checkout_view():
+    form = CheckoutForm()
+    if not form.validate_on_submit():
+        return redirect(url_for('views.cart'))
+    try:
+        order = checkout(current_user.user_id)
+    except InsufficientStock as exc:
+        names = [entry.name for entry in load_cart(current_user.user_id).entries
+                 if entry.item_id in exc.item_ids]
+        flash('Not enough stock left for: ' + ', '.join(names) + '. Nothing was charged.', 'danger')
+        return redirect(url_for('views.cart'))
+    if order is None:
+        flash('Your cart is empty.', 'info')
+        return redirect(url_for('views.cart'))
+    flash(f'Order #{order.order_id} placed. Total: P{order.total:.2f}', 'success')
+    return redirect(url_for('views.cart'))
+
+
 # --------------------------------------------- user profile routes -------------------------------------------------------
 @views_bp.route('/profile', methods=['GET'])
 @login_required
+@query_budget(2)
 def profile():
     # Display the current user's profile and address.
-    user = current_user
+    # (current_user is a slim cached principal; load the full row here)
+    user = db.session.get(User, current_user.user_id)
+    conditional('profile', user.updated_at, last_modified=user.updated_at)
     address = user.address  # thanks to one-to-one relationship
 
     return render_template('profile.html', user=user, address=address)
@@ -94,7 +248,7 @@ def profile():
 @views_bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
-    user = current_user
+    user = db.session.get(User, current_user.user_id)
     form = UserProfileForm(obj=user)
 
     if form.validate_on_submit():
@@ -104,10 +258,11 @@ def edit_profile():
         user.birthdate = form.birthdate.data
         user.contact_num = form.contact_num.data
         user.bio = form.bio.data
+        user.updated_at = datetime.utcnow()  # address changes don't touch the users row
 
-        # Handle profile image upload
+        # Handle profile image upload (processed in the background)
         if form.profile_image.data:
-            user.profile_img_url = save_profile_picture(form.profile_image.data)
+            attach_picture(user, form.profile_image.data)
 
         # Handle address
         if user.address:
@@ -126,6 +281,8 @@ def edit_profile():
             db.session.add(new_address)
 
         db.session.commit()
+        user_cache.invalidate(user.user_id)
+        image_worker.kick()
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('views.profile'))
 
@@ -134,17 +291,113 @@ def edit_profile():
 #_______________________________________________________________________________________________________________
 # ------------------------------------ routes related to user created shop -------------------------------------
 #_______________________________________________________________________________________________________________
+def _item_cards(shop_id):
+    """Items of a shop with only the columns a card shows, category joined in."""
+    return (Item.query
+            .filter_by(shop_id=shop_id)
+            .options(load_only(Item.item_id, Item.name, Item.description, Item.price,
+                               Item.stock, Item.img_url, Item.img_status, Item.revision),
+                     joinedload(Item.category).load_only(Category.name)))
+
+
+def _paginate_items(shop_id, limit=DEFAULT_PAGE_SIZE):
+    """Keyset page of item cards from the ?sort= and ?after= query args."""
+    sort = request.args.get('sort', 'id')
+    if sort not in SORTS:
+        abort(400)
+    try:
+        items, next_cursor = keyset_page(_item_cards(shop_id), sort,
+                                         request.args.get('after'), limit)
+    except InvalidCursor:
+        abort(400)
+    return items, next_cursor, sort
+
+
 # --- READ: My Shop 
 @views_bp.route('/myshop')
 @login_required
+@query_budget(2)
 def my_shop():
     # Ensure user has a shop
-    if not current_user.shops:
+    if not current_user.shop_id:
         return redirect(url_for('views.home')) 
     
-    shop = current_user.shops[0] # Getting the first shop
-    items = shop.items 
-    return render_template('my_shop.html', shop=shop, items=items)
+    shop = db.session.get(Shop, current_user.shop_id) # Getting the first shop
+
+    # The page only changes with the shop revision: revalidations end here with a 304
+    conditional('myshop', shop.shop_id, shop.revision, last_modified=shop.updated_at)
+
+    # One query per page for the whole grid; cards come from the fragment cache
+    items, next_cursor, sort = _paginate_items(shop.shop_id)
+    return render_template('my_shop.html', shop=shop, items=items,
+                           next_cursor=next_cursor, sort=sort)
+
+
+# --- API: paginated items of any shop ---
+# GET /api/shops/<id>/items?sort=id|price&after=<cursor>&limit=<n>
+@views_bp.route('/api/shops/<int:shop_id>/items')
+def api_shop_items(shop_id):
+    Shop.query.get_or_404(shop_id)
+    items, next_cursor, _ = _paginate_items(
+        shop_id, request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+    return jsonify(
+        items=[{
+            'item_id': item.item_id,
+            'name': item.name,
+            'description': item.description,
+            'price': item.price,
+            'stock': item.stock,
+            'category': item.category.name if item.category else None,
+            'img_url': url_for('static', filename=item.img_url),
+            'img_status': item.img_status,
+        } for item in items],
+        next_cursor=next_cursor,
+    )
+
+
+# --- PUBLIC SHOP PAGES ---
+# Ratings come from the aggregates on shops: no AVG() over shop_ratings anywhere.
+@views_bp.route('/shops')
+@query_budget(2)   # a second query only while fewer than TOP_RATED_LIMIT shops are rated
+def shop_list():
+    return render_template('shop_list.html', shops=top_rated())
+
+
+@views_bp.route('/shops/<int:shop_id>')
+def shop_page(shop_id):
+    shop = Shop.query.get_or_404(shop_id)
+    items, next_cursor, sort = _paginate_items(shop_id)
+    form = Rate_shop()
+    if current_user.is_authenticated:
+        form.stars.data = user_rating(current_user.user_id, shop_id) or 5
+    return render_template('shop.html', shop=shop, items=items, next_cursor=next_cursor,
+                           sort=sort, form=form, cart_form=Add_to_cart())
+
+
+@views_bp.route('/shops/<int:shop_id>/rate', methods=['POST'])
+@login_required
+def rate_shop_view(shop_id):
+    shop = Shop.query.get_or_404(shop_id)
+    if shop.owner_id == current_user.user_id:
+        flash("You can't rate your own shop.", 'warning')
+        return redirect(url_for('views.shop_page', shop_id=shop_id))
+    form = Rate_shop()
+    if not form.validate_on_submit():
+        return redirect(url_for('views.shop_page', shop_id=shop_id))
+    if request.form.get('remove'):
+        if remove_rating(current_user.user_id, shop_id):
+            db.session.commit()
+            flash('Your rating was removed.', 'info')
+    else:
+        try:
+            rate_shop(current_user.user_id, shop_id, form.stars.data)
+            db.session.commit()
+            flash('Thanks for rating this shop!', 'success')
+        except IntegrityError:
+            # A simultaneous rating by the same user won; nothing was changed
+            db.session.rollback()
+            flash('Your rating was just updated elsewhere. Please try again.', 'warning')
+    return redirect(url_for('views.shop_page', shop_id=shop_id))
 
 
 # ------------------------------------------------- create shop route ------------------------------------------
@@ -152,7 +405,7 @@ def my_shop():
 @login_required
 def create_shop():
     # Check if user already has a shop
-    if current_user.shops:
+    if current_user.shop_id:
         flash("You already have a shop.", "info")
         return redirect(url_for('views.my_shop'))
 
@@ -164,7 +417,10 @@ def create_shop():
             owner_id=current_user.user_id
         )
         db.session.add(new_shop)
+        db.session.flush()
+        db.session.add(ShopStats(shop_id=new_shop.shop_id))
         db.session.commit()
+        user_cache.invalidate(current_user.user_id)
         flash('Shop created successfully!', 'success')
         return redirect(url_for('views.my_shop'))
     return render_template('create_shop.html', form=form)
@@ -174,31 +430,38 @@ def create_shop():
 @views_bp.route('/add-product', methods=['GET', 'POST'])
 @login_required
 def add_product():
-    # ... (shop checks) ...
+    if not current_user.shop_id:
+        flash("Create a shop before adding products.", "info")
+        return redirect(url_for('views.create_shop'))
     form = ItemForm()
     if form.validate_on_submit():
-        shop = current_user.shops[0]
+        shop_id = current_user.shop_id
         
-        # 1. Handle Image (same as before)
-        image_file = save_picture(form.image.data) if form.image.data else 'products/default.jpg'
-
-        # 2. Handle Category (String -> Object)
-        cat_obj = get_or_create_category(form.category.data)
+        # 1. Handle Category (name -> id; cached, created in this transaction if new)
+        cat_id = category_id(form.category.data)
 
         new_item = Item(
             name=form.name.data,
             description=form.description.data,
             price=form.price.data,
             stock=form.stock.data,
-            img_url=image_file,
-            shop_id=shop.shop_id,
+            img_url='products/default.jpg',  # replaced by the image worker once processed
+            shop_id=shop_id,
             
             # Link to the Category ID we just found/created
-            category_id=cat_obj.id 
+            category_id=cat_id
         )
         
         db.session.add(new_item)
+        item_added(new_item)
+        bump_shop(shop_id)
+
+        # 2. Handle Image (resized in the background; the item shows a placeholder until then)
+        if form.image.data:
+            attach_picture(new_item, form.image.data)
+
         db.session.commit()
+        image_worker.kick()
         flash('Product added successfully!', 'success')
         return redirect(url_for('views.my_shop'))
 
@@ -212,29 +475,51 @@ def edit_product(item_id):
     item = Item.query.get_or_404(item_id)
     # ... (security checks) ...
     form = ItemForm()
+    conflict = False
     
     if form.validate_on_submit():
-        item.name = form.name.data
-        item.description = form.description.data
-        item.price = form.price.data
-        item.stock = form.stock.data
-        
-        # Update Category
-        cat_obj = get_or_create_category(form.category.data)
-        item.category_id = cat_obj.id
-        
-        if form.image.data:
-            item.img_url = save_picture(form.image.data)
-            
-        db.session.commit()
-        flash('Product updated!', 'success')
-        return redirect(url_for('views.my_shop'))
-    
-    elif request.method == 'GET':
+        # Optimistic concurrency: the form carries the revision it was loaded at
+        if form.revision.data and int(form.revision.data) != item.revision:
+            conflict = True
+        else:
+            # The UPDATE is guarded by the revision (version_id_col); a concurrent
+            # write in between raises instead of being silently overwritten. The
+            # queries below autoflush the dirty item, so they are inside the try too.
+            try:
+                old_price, old_stock = item.price, item.stock
+                item.name = form.name.data
+                item.description = form.description.data
+                item.price = form.price.data
+                item.stock = form.stock.data
+
+                # Update Category
+                item.category_id = category_id(form.category.data)
+                item_changed(item, old_price, old_stock)
+                bump_shop(item.shop_id)
+
+                if form.image.data:
+                    attach_picture(item, form.image.data)
+
+                db.session.commit()
+            except StaleDataError:
+                db.session.rollback()
+                conflict = True
+            else:
+                image_worker.kick()
+                flash('Product updated!', 'success')
+                return redirect(url_for('views.my_shop'))
+
+    if conflict:
+        flash("This product was changed while you were editing. The form now shows the latest "
+              "values; re-apply your changes and save again.", "warning")
+        form = ItemForm(formdata=None)
+
+    if request.method == 'GET' or conflict:
         form.name.data = item.name
         form.description.data = item.description
         form.price.data = item.price
         form.stock.data = item.stock
+        form.revision.data = item.revision
         
         # PRE-FILL: We need to put the *Name* of the category in the text box
         if item.category:
@@ -252,33 +537,99 @@ def delete_product(item_id):
     # Security Check
     if item.shop.owner_id != current_user.user_id:
         abort(403)
-        
+
+    # Order history keeps pointing at sold items: those stay, out of stock
+    # is the way to withdraw them
+    if db.session.query(OrderLine.query.filter_by(item_id=item_id).exists()).scalar():
+        flash("This product has been ordered, so it can't be deleted. Set its stock to 0 "
+              "to stop selling it.", 'warning')
+        return redirect(url_for('views.my_shop'))
+
+    CartLine.query.filter_by(item_id=item_id).delete(synchronize_session=False)
+    release(item.img_url)
     db.session.delete(item)
+    item_removed(item)
+    bump_shop(item.shop_id)
     db.session.commit()
+    collect_garbage()  # removes the image files if no other row uses them
     flash('Product deleted.', 'success')
     return redirect(url_for('views.my_shop'))
 
 
 
 
+# ------------------------------------------------- BULK IMPORT / EXPORT ------------------------------------
+@views_bp.route('/import-items', methods=['GET', 'POST'])
+@login_required
+def import_items_view():
+    # The cached principal can outlive a deleted shop; items need a real one
+    if not current_user.shop_id or db.session.get(Shop, current_user.shop_id) is None:
+        flash("Create a shop before importing products.", "info")
+        return redirect(url_for('views.create_shop'))
+
+    form = ItemImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        fmt = 'jsonl' if upload.filename.lower().endswith('.jsonl') else 'csv'
+        report = import_items(current_user.shop_id, iter_records(upload.stream, fmt))
+        flash(f'Imported {report.inserted} product(s), {report.failed} row(s) rejected.',
+              'success' if not report.failed else 'warning')
+
+    return render_template('import_items.html', form=form, report=report)
+
+
+@views_bp.route('/export-items.<fmt>')
+@login_required
+def export_items_view(fmt):
+    if fmt not in FORMATS or not current_user.shop_id:
+        abort(404)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_items(current_user.shop_id, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=items.{fmt}'},
+    )
+
+
 # user shop dashboard
 # only user has shop can have a dashboard
 # shop dashboard show the shop details, statistic
 @views_bp.route('/dashboard')
 @login_required
+@query_budget(2)
 def dashboard():
-    shop = current_user.shops[0]
+    if not current_user.shop_id:
+        return redirect(url_for('views.create_shop'))
+    shop = db.session.get(Shop, current_user.shop_id)
+    # Every item write bumps the shop revision, so it also versions the totals
+    conditional('dashboard', shop.shop_id, shop.revision, last_modified=shop.updated_at)
 
-    total_items = db.session.query(func.count(Item.item_id)).filter_by(shop_id=shop.shop_id).scalar()
-    total_stock = db.session.query(func.sum(Item.stock)).filter_by(shop_id=shop.shop_id).scalar() or 0
-    total_value = db.session.query(func.sum(Item.price * Item.stock)).filter_by(shop_id=shop.shop_id).scalar() or 0
+    # Running totals maintained on every item write (see stats.py)
+    stats = get_stats(shop.shop_id)
 
     return render_template(
         'dashboard.html',
         shop=shop,
-        total_items=total_items,
-        total_stock=total_stock,
-        total_value=total_value
+        total_items=stats.item_count,
+        total_stock=stats.total_stock,
+        total_value=stats.total_value
     )
 
 
+# background image queue health (admin only)
+@views_bp.route('/admin/image-jobs')
+@login_required
+def image_job_stats():
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify(image_worker.stats())
+
+
+# user_loader cache effectiveness (admin only)
+@views_bp.route('/admin/user-cache')
+@login_required
+def user_cache_stats():
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify(user_cache.stats())